@@ -0,0 +1,200 @@
+"""
+Benchmark the per-request overhead of the HireFire Django integration
+on requests that aren't for HireFire.
+
+Times a request to ``--path`` through a minimal handler directly, wrapped
+in the ``HireFireMiddleware`` in sync and async mode, and the resolving of
+the path with and without ``hirefire.contrib.django.urls`` included in
+the URLconf::
+
+    python benchmarks/bench_django_middleware.py > before.json
+
+The results are written as JSON, to compare them across commits.
+"""
+from __future__ import absolute_import
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOKEN = 'bench'
+
+
+class AppURLconf(object):
+    """
+    The URLconf of the app, set up in setup_django().
+    """
+    urlpatterns = []
+
+
+class HireFireURLconf(object):
+    """
+    The URLconf of the app with the HireFire views included last.
+    """
+    urlpatterns = []
+
+
+class StandInProc(object):
+    """
+    Never evaluated, the benchmarked requests aren't for HireFire.
+    """
+    name = 'worker'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        return 0
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def setup_django():
+    import django
+    from django.conf import settings
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='bench',
+        ALLOWED_HOSTS=['*'],
+        ROOT_URLCONF=AppURLconf,
+        HIREFIRE_TOKEN=TOKEN,
+        HIREFIRE_PROCS=[StandInProc()],
+    )
+    django.setup()
+
+    from django.urls import include, path
+    view = lambda request: None  # noqa: E731
+    AppURLconf.urlpatterns[:] = [path('app/<path:rest>', view)]
+    HireFireURLconf.urlpatterns[:] = AppURLconf.urlpatterns + [
+        path('', include('hirefire.contrib.django.urls')),
+    ]
+
+
+def per_call_ns(call, number, repeat):
+    """
+    Return the best of ``repeat`` runs of the nanoseconds per call.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = (time.perf_counter() - start) / number * 1e9
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def async_per_call_ns(call, number, repeat):
+    async def run():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                await call()
+            elapsed = (time.perf_counter() - start) / number * 1e9
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    return asyncio.run(run())
+
+
+def measure(args):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+    from hirefire.contrib.django.middleware import HireFireMiddleware
+
+    request = RequestFactory().get(args.path)
+    response = HttpResponse()
+
+    def get_response(request):
+        return response
+
+    async def aget_response(request):
+        return response
+
+    middleware = HireFireMiddleware(get_response)
+    amiddleware = HireFireMiddleware(aget_response)
+    timings = {
+        'sync_handler': per_call_ns(
+            lambda: get_response(request), args.number, args.repeat),
+        'sync_middleware': per_call_ns(
+            lambda: middleware(request), args.number, args.repeat),
+        'async_handler': async_per_call_ns(
+            lambda: aget_response(request), args.number, args.repeat),
+        'async_middleware': async_per_call_ns(
+            lambda: amiddleware(request), args.number, args.repeat),
+        'resolve': per_call_ns(
+            lambda: resolve(args.path, AppURLconf),
+            args.number, args.repeat),
+        'resolve_with_hirefire_urls': per_call_ns(
+            lambda: resolve(args.path, HireFireURLconf),
+            args.number, args.repeat),
+    }
+    return {
+        'per_request_ns': timings,
+        'overhead_ns': {
+            'sync_middleware': (timings['sync_middleware'] -
+                                timings['sync_handler']),
+            'async_middleware': (timings['async_middleware'] -
+                                 timings['async_handler']),
+            'urls': (timings['resolve_with_hirefire_urls'] -
+                     timings['resolve']),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', default='/app/some/page',
+                        help='the path of the requests (default: '
+                             '%(default)s)')
+    parser.add_argument('--number', type=int, default=100000,
+                        help='requests per run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs, the best one is reported '
+                             '(default: %(default)s)')
+    parser.add_argument('--output', '-o', help='write the JSON results to '
+                                               'this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_django()
+    results = measure(args)
+    for name, value in sorted(results['overhead_ns'].items()):
+        sys.stderr.write('%-18s overhead=%8.1fns\n' % (name, value))
+
+    output = json.dumps({
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'path': args.path,
+            'number': args.number,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+"""
+Benchmark the HireFire info page with local stand-ins for the brokers.
+
+Builds ``--procs`` procs of ``--queues`` queues each for every backend,
+backed by fakeredis (RQ, Huey, HotQueue) and kombu's in-memory transport
+with a stubbed inspect (Celery), and measures the latency, the memory
+allocated and the broker round-trips of each request, sequentially and
+with ``--concurrency`` requests in flight, by calling ``dump_procs``
+directly and through the Django, Flask and Tornado integrations::
+
+    python benchmarks/bench_info.py --procs 4 --queues 8 > before.json
+
+The results are written as JSON, to compare them across commits.
+Backends whose library isn't installed are listed as skipped.
+"""
+from __future__ import absolute_import
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hirefire import metrics  # noqa: E402
+from hirefire.procs import Procs, serialize_procs  # noqa: E402
+from hirefire.utils import TimeAwareJSONEncoder  # noqa: E402
+
+TOKEN = 'bench'
+BACKENDS = ('rq', 'huey', 'hotqueue', 'celery')
+TARGETS = ('dump_procs', 'django', 'flask', 'tornado')
+
+#: The Django URLconf, the middleware answers before URLs are resolved.
+urlpatterns = []
+
+
+class StubInspect(object):
+    """
+    Replies to Celery's inspect calls like one worker per queue would,
+    after ``latency`` seconds.
+    """
+    def __init__(self, queues, latency):
+        self.queues = queues
+        self.latency = latency
+
+    def _reply(self, tasks):
+        time.sleep(self.latency)
+        return dict(('bench@%s' % queue, tasks(queue))
+                    for queue in self.queues)
+
+    def _task(self, queue):
+        return {'delivery_info': {'exchange': queue, 'routing_key': queue}}
+
+    def active_queues(self):
+        return self._reply(lambda queue: [
+            {'name': queue, 'routing_key': queue, 'exchange': {'name': queue}}
+        ])
+
+    def active(self):
+        return self._reply(lambda queue: [self._task(queue)])
+
+    def reserved(self):
+        return self._reply(lambda queue: [self._task(queue)] * 2)
+
+    def scheduled(self):
+        return self._reply(lambda queue: [{'request': self._task(queue)}])
+
+
+def queue_names(backend, procs, queues):
+    return [['%s_%d_%d' % (backend, i, j) for j in range(queues)]
+            for i in range(procs)]
+
+
+def build_procs(backend, args, server):
+    """
+    Return the procs of the given backend, with a few messages in
+    each of their queues.
+    """
+    from fakeredis import FakeRedis
+    names = queue_names(backend, args.procs, args.queues)
+    procs = Procs()
+
+    if backend == 'rq':
+        from hirefire.procs.rq import RQProc
+        connection = FakeRedis(server=server)
+        for i, queues in enumerate(names):
+            for queue in queues:
+                connection.rpush('rq:queue:%s' % queue, *range(3))
+            procs['rq_%d' % i] = RQProc(connection=connection,
+                                        name='rq_%d' % i, queues=queues)
+
+    elif backend == 'huey':
+        from hirefire.procs.huey import HueyRedisProc
+        pool = FakeRedis(server=server).connection_pool
+        for i, queues in enumerate(names):
+            proc = HueyRedisProc(connection_params={'connection_pool': pool},
+                                 name='huey_%d' % i, queues=queues)
+            for client in proc.clients:
+                for _ in range(3):
+                    client.write('message')
+            procs[proc.name] = proc
+
+    elif backend == 'hotqueue':
+        from hirefire.procs.hotqueue import HotQueueProc
+        pool = FakeRedis(server=server).connection_pool
+        for i, queues in enumerate(names):
+            proc = HotQueueProc(connection_params={'connection_pool': pool},
+                                name='hotqueue_%d' % i, queues=queues)
+            for client in proc.clients:
+                client.put('message', 'message', 'message')
+            procs[proc.name] = proc
+
+    elif backend == 'celery':
+        from celery import Celery
+        from kombu import Producer
+        from hirefire.procs.celery import CeleryProc
+        app = Celery('hirefire_bench', broker='memory://')
+        all_queues = [queue for queues in names for queue in queues]
+        with app.connection_for_write() as connection:
+            channel = connection.default_channel
+            for queue in all_queues:
+                channel.queue_declare(queue=queue)
+                channel.queue_purge(queue=queue)
+                for _ in range(3):
+                    Producer(channel).publish({}, routing_key=queue)
+        inspect = StubInspect(all_queues, args.inspect_latency / 1000.0)
+        app.control.inspect = lambda *args, **kwargs: inspect
+        for i, queues in enumerate(names):
+            procs['celery_%d' % i] = CeleryProc(
+                app=app, name='celery_%d' % i, queues=queues)
+
+    return procs
+
+
+class Targets(object):
+    """
+    Builds a function making one info request for each target.
+    """
+    def __init__(self, args):
+        self.args = args
+        self._django = None
+
+    def dump_procs(self, procs):
+        def request():
+            data = serialize_procs(procs,
+                                   use_concurrency=self.args.use_concurrency,
+                                   coalesce=True)
+            return json.dumps(data, cls=TimeAwareJSONEncoder,
+                              ensure_ascii=False)
+        return request, lambda: None
+
+    def django(self, procs):
+        if self._django is None:
+            import django
+            from django.conf import settings
+            settings.configure(
+                DEBUG=False,
+                SECRET_KEY='bench',
+                ALLOWED_HOSTS=['*'],
+                ROOT_URLCONF=__name__,
+                MIDDLEWARE=[
+                    'hirefire.contrib.django.middleware.HireFireMiddleware',
+                ],
+                HIREFIRE_TOKEN=TOKEN,
+                HIREFIRE_PROCS=list(procs.values()),
+            )
+            django.setup()
+            from django.test import Client
+            from hirefire.contrib.django import middleware
+            self._django = (Client(), middleware)
+        client, middleware = self._django
+        middleware.HireFireMiddleware.loaded_procs = procs
+        middleware.SERIALIZE_KWARGS['use_concurrency'] = (
+            self.args.use_concurrency)
+        path = '/hirefire/%s/info' % TOKEN
+
+        def request():
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+            return response.content
+        return request, lambda: None
+
+    def flask(self, procs):
+        from flask import Flask
+        from hirefire.contrib.flask.blueprint import build_hirefire_blueprint
+        app = Flask(__name__)
+        app.register_blueprint(build_hirefire_blueprint(
+            TOKEN, list(procs.values())))
+        client = app.test_client()
+        path = '/hirefire/%s/info' % TOKEN
+
+        def request():
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+            return response.data
+        return request, lambda: None
+
+    def tornado(self, procs):
+        import tornado.web
+        from tornado.httpclient import AsyncHTTPClient
+        from tornado.httpserver import HTTPServer
+        from tornado.testing import bind_unused_port
+        from hirefire.contrib.tornado.handlers import hirefire_handlers
+
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        state = {}
+
+        async def setup():
+            app = tornado.web.Application(
+                hirefire_handlers(TOKEN, list(procs.values())))
+            sock, port = bind_unused_port()
+            state['server'] = HTTPServer(app)
+            state['server'].add_sockets([sock])
+            state['client'] = AsyncHTTPClient()
+            state['url'] = 'http://127.0.0.1:%d/hirefire/%s/info' % (
+                port, TOKEN)
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(setup())
+            started.set()
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        started.wait()
+
+        async def fetch():
+            response = await state['client'].fetch(state['url'])
+            return response.body
+
+        def request():
+            return asyncio.run_coroutine_threadsafe(fetch(), loop).result()
+
+        def close():
+            async def stop():
+                state['server'].stop()
+            asyncio.run_coroutine_threadsafe(stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        return request, close
+
+
+def round_trips():
+    return sum(value for name, labels, value
+               in metrics.broker_round_trips.samples())
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def measure(request, args, concurrency):
+    """
+    Return the statistics of ``args.requests`` calls of ``request``,
+    with ``concurrency`` of them in flight.
+    """
+    request()  # warm up connections and caches
+
+    def timed(_):
+        start = time.perf_counter()
+        request()
+        return time.perf_counter() - start
+
+    trips = round_trips()
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(i) for i in range(args.requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(executor.map(timed, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    trips = round_trips() - trips
+
+    # Allocations are measured apart, tracing slows everything down.
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(args.alloc_requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            request()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies = [latency * 1000 for latency in latencies]
+    return {
+        'latency_ms': {
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'max': max(latencies),
+        },
+        'throughput_rps': args.requests / elapsed,
+        'round_trips_per_request': trips / float(args.requests),
+        'alloc_peak_kib': {
+            'mean': statistics.mean(peaks) / 1024.0 if peaks else None,
+            'max': max(peaks) / 1024.0 if peaks else None,
+        },
+        'alloc_retained_kib': (statistics.mean(retained) / 1024.0
+                               if retained else None),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--procs', type=int, default=4,
+                        help='procs per backend (default: %(default)s)')
+    parser.add_argument('--queues', type=int, default=4,
+                        help='queues per proc (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='timed requests per run (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='requests in flight in the concurrent mode '
+                             '(default: %(default)s)')
+    parser.add_argument('--alloc-requests', type=int, default=5,
+                        help='requests traced for allocations '
+                             '(default: %(default)s)')
+    parser.add_argument('--inspect-latency', type=float, default=5,
+                        help='milliseconds the stubbed Celery inspect '
+                             'takes per call (default: %(default)s)')
+    parser.add_argument('--use-concurrency', action='store_true',
+                        help='evaluate the procs of a request concurrently '
+                             '(dump_procs and Django)')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='only benchmark these backends')
+    parser.add_argument('--target', action='append', choices=TARGETS,
+                        help='only benchmark through these targets')
+    parser.add_argument('--output', '-o', help='write the JSON results to '
+                                               'this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from fakeredis import FakeServer
+
+    args = parse_args(argv)
+    warnings.simplefilter('ignore')
+    targets = Targets(args)
+    modes = [('sequential', 1), ('concurrent', args.concurrency)]
+    results, skipped = [], []
+
+    for backend in args.backend or BACKENDS:
+        try:
+            procs = build_procs(backend, args, FakeServer())
+        except ImportError as e:
+            skipped.append({'backend': backend, 'reason': str(e)})
+            continue
+        for target in args.target or TARGETS:
+            request, close = getattr(targets, target)(procs)
+            try:
+                request()
+                for mode, concurrency in modes:
+                    result = {
+                        'backend': backend,
+                        'target': target,
+                        'mode': mode,
+                        'concurrency': concurrency,
+                    }
+                    result.update(measure(request, args, concurrency))
+                    results.append(result)
+                    sys.stderr.write(
+                        '%-8s %-10s %-10s p50=%8.2fms p95=%8.2fms '
+                        'round-trips=%.1f\n' % (
+                            backend, target, mode,
+                            result['latency_ms']['p50'],
+                            result['latency_ms']['p95'],
+                            result['round_trips_per_request']))
+            finally:
+                close()
+
+    output = json.dumps({
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'procs': args.procs,
+            'queues': args.queues,
+            'requests': args.requests,
+            'use_concurrency': args.use_concurrency,
+            'inspect_latency_ms': args.inspect_latency,
+        },
+        'results': results,
+        'skipped': skipped,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
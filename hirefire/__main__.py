@@ -0,0 +1,8 @@
+from __future__ import absolute_import
+
+import sys
+
+from hirefire.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
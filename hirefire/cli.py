@@ -0,0 +1,377 @@
+"""
+The ``hirefire`` command line interface (also ``python -m hirefire``),
+to serve the HireFire endpoints next to the web server of the
+application, or to inspect a proc configuration offline::
+
+    hirefire serve --procs mysite.procs.WorkerProc --port 8001
+    hirefire info --procs mysite.procs.WorkerProc
+    hirefire profile --procs mysite.procs.WorkerProc --runs 20
+    hirefire bench --procs mysite.procs.WorkerProc --runs 20
+
+The options default to the environment variables the contrib
+integrations use, like ``HIREFIRE_PROCS`` and ``HIREFIRE_TOKEN``.
+"""
+from __future__ import absolute_import
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import re
+import signal
+import sys
+import time
+
+from hirefire import metrics
+from hirefire.procs import (
+    async_serialize_procs, dump_procs, load_procs, serialize_procs, Procs
+)
+from hirefire.snapshot import DEFAULT_INTERVAL
+
+__all__ = ['main']
+
+
+def env_list(name):
+    """
+    Return the comma or whitespace separated values of the environment
+    variable ``name``.
+    """
+    return [value for value in re.split(r'[\s,]+', os.environ.get(name, ''))
+            if value]
+
+
+def env_float(name, default=None):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def proc_paths(parser, args):
+    """
+    Return the dotted paths of the procs given with ``--procs`` or
+    ``HIREFIRE_PROCS``, importable from the current directory like
+    with ``python -m``.
+    """
+    procs = args.procs or env_list('HIREFIRE_PROCS')
+    if not procs:
+        parser.error('at least one proc is required, pass --procs or set '
+                     'the HIREFIRE_PROCS environment variable')
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    return procs
+
+
+def add_procs_argument(parser):
+    parser.add_argument('--procs', action='append', metavar='PROC',
+                        help='dotted path of a proc class, may be given '
+                             'several times (default: HIREFIRE_PROCS)')
+
+
+def add_runs_arguments(parser):
+    parser.add_argument('--runs', type=int, default=10,
+                        help='timed runs (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank ``percent`` percentile of ``values``.
+    """
+    ordered = sorted(values)
+    index = max(int(math.ceil(percent / 100.0 * len(ordered))) - 1, 0)
+    return ordered[index]
+
+
+def summarize(durations):
+    """
+    Return the latency percentiles of the ``durations`` in milliseconds.
+    """
+    values = [duration * 1000 for duration in durations]
+    return {
+        'min': min(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values),
+        'mean': sum(values) / len(values),
+    }
+
+
+def metric_total(metric, sample_name=None):
+    """
+    Return the sum of the samples named ``sample_name`` (defaults to the
+    name of the metric) over all labels of the ``metric``.
+    """
+    sample_name = sample_name or metric.name
+    return sum(value for name, pairs, value in metric.samples()
+               if name == sample_name)
+
+
+class Counters(object):
+    """
+    Measures the broker round-trips made and the time spent waiting for
+    Celery inspect replies between two calls of :meth:`read`.
+    """
+    def __init__(self):
+        self.last = self.totals()
+
+    @staticmethod
+    def totals():
+        return (
+            metric_total(metrics.broker_round_trips),
+            metric_total(metrics.celery_inspect_duration,
+                         metrics.celery_inspect_duration.name + '_sum'),
+        )
+
+    def read(self):
+        totals = self.totals()
+        round_trips, inspect = [now - last
+                                for now, last in zip(totals, self.last)]
+        self.last = totals
+        return round_trips, inspect
+
+
+class TimedRuns(object):
+    """
+    Collects the durations and failures of ``runs`` calls, the broker
+    round-trips and inspect milliseconds per call, and the last result.
+    """
+    def __init__(self, runs):
+        self.runs = runs
+        self.durations = []
+        self.errors = 0
+        self.error = None
+        self.result = None
+        self.counters = Counters()
+
+    def add(self, start, result=None, error=None):
+        self.durations.append(time.monotonic() - start)
+        if error is not None:
+            self.errors += 1
+            self.error = repr(error)
+        else:
+            self.result = result
+
+    def summary(self):
+        round_trips, inspect = self.counters.read()
+        return {
+            'runs': self.runs,
+            'errors': self.errors,
+            'last_error': self.error,
+            'latency_ms': summarize(self.durations),
+            'round_trips_per_run': round_trips / float(self.runs),
+            'inspect_ms_per_run': inspect * 1000 / self.runs,
+        }, self.result
+
+
+def timed_runs(runs, func):
+    """
+    Call ``func`` ``runs`` times and return the percentiles of its
+    durations, the number of calls that failed, the broker round-trips
+    and inspect milliseconds per call, and the last result.
+    """
+    timed = TimedRuns(runs)
+    for _ in range(runs):
+        start = time.monotonic()
+        try:
+            timed.add(start, func())
+        except Exception as e:
+            timed.add(start, error=e)
+    return timed.summary()
+
+
+async def async_timed_runs(runs, func):
+    """
+    Like :func:`timed_runs`, but awaiting ``func()`` on the running event
+    loop, so that setting up a loop isn't part of the timings.
+    """
+    timed = TimedRuns(runs)
+    for _ in range(runs):
+        start = time.monotonic()
+        try:
+            timed.add(start, await func())
+        except Exception as e:
+            timed.add(start, error=e)
+    return timed.summary()
+
+
+def print_table(rows, key, fp=None):
+    fp = fp or sys.stdout
+    fp.write('%-20s %9s %9s %9s %9s %12s %12s %7s\n' % (
+        key, 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'round-trips',
+        'inspect ms', 'errors'))
+    for row in rows:
+        latency = row['latency_ms']
+        fp.write('%-20s %9.2f %9.2f %9.2f %9.2f %12.1f %12.2f %7d\n' % (
+            row[key], latency['p50'], latency['p90'], latency['p99'],
+            latency['max'], row['round_trips_per_run'],
+            row['inspect_ms_per_run'], row['errors']))
+
+
+def serve(parser, args):
+    from hirefire.server import HireFireServer
+
+    server = HireFireServer(
+        proc_paths(parser, args),
+        token=args.token,
+        snapshot_interval=args.snapshot_interval or None,
+        snapshot_max_age=args.snapshot_max_age,
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await server.serve(args.host, args.port, args.unix)
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    return 0
+
+
+def info(parser, args):
+    procs = load_procs(*proc_paths(parser, args))
+    print(dump_procs(procs))
+    return 0
+
+
+def profile(parser, args):
+    procs = load_procs(*proc_paths(parser, args))
+    rows = []
+    for name, proc in procs.items():
+        single = Procs([(name, proc)])
+        result, data = timed_runs(args.runs, lambda: serialize_procs(single))
+        result['proc'] = name
+        result['quantity'] = data[0]['quantity'] if data else None
+        rows.append(result)
+
+    if args.json:
+        print(json.dumps(rows, indent=2, sort_keys=True))
+    else:
+        print_table(rows, 'proc')
+        for row in rows:
+            if row['last_error']:
+                print('%s failed: %s' % (row['proc'], row['last_error']))
+    return 0
+
+
+def bench(parser, args):
+    procs = load_procs(*proc_paths(parser, args))
+
+    def run_sync(func):
+        # Warm up the clients and connections of the procs first.
+        timed_runs(1, func)
+        return timed_runs(args.runs, func)
+
+    async def run_async():
+        # All runs on one event loop, like in an ASGI server.
+        func = functools.partial(async_serialize_procs, procs)
+        await async_timed_runs(1, func)
+        return await async_timed_runs(args.runs, func)
+
+    modes = [
+        ('sequential', lambda: run_sync(
+            lambda: serialize_procs(procs, use_concurrency=False))),
+        ('concurrent', lambda: run_sync(
+            lambda: serialize_procs(procs, use_concurrency=True))),
+        ('async', lambda: asyncio.run(run_async())),
+    ]
+    rows = []
+    for mode, run in modes:
+        result, data = run()
+        result['mode'] = mode
+        rows.append(result)
+
+    if args.json:
+        print(json.dumps(rows, indent=2, sort_keys=True))
+    else:
+        print_table(rows, 'mode')
+        sequential, concurrent = rows[0]['latency_ms'], rows[1]['latency_ms']
+        if concurrent['p50']:
+            print('concurrent p50 speedup: %.2fx' %
+                  (sequential['p50'] / concurrent['p50']))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='hirefire',
+        description='Serve and inspect the HireFire procs of a project.')
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='(default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    parser_serve = subparsers.add_parser(
+        'serve', help='serve the HireFire endpoints with an asyncio server',
+        description='Serve /hirefire/test and /hirefire/<token>/info from '
+                    'a snapshot of the procs, on its own port or Unix '
+                    'socket.')
+    add_procs_argument(parser_serve)
+    parser_serve.add_argument(
+        '--token', default=os.environ.get('HIREFIRE_TOKEN', 'development'),
+        help='the HireFire token (default: HIREFIRE_TOKEN or development)')
+    parser_serve.add_argument(
+        '--host', default=os.environ.get('HIREFIRE_HOST', '127.0.0.1'),
+        help='(default: HIREFIRE_HOST or %(default)s)')
+    parser_serve.add_argument(
+        '--port', type=int, default=int(os.environ.get('HIREFIRE_PORT', 8001)),
+        help='(default: HIREFIRE_PORT or %(default)s)')
+    parser_serve.add_argument(
+        '--unix', metavar='PATH', default=os.environ.get('HIREFIRE_SOCKET'),
+        help='listen on this Unix socket instead of --host and --port '
+             '(default: HIREFIRE_SOCKET)')
+    parser_serve.add_argument(
+        '--snapshot-interval', type=float,
+        default=env_float('HIREFIRE_SNAPSHOT_INTERVAL', DEFAULT_INTERVAL),
+        help='seconds between two evaluations of the procs, 0 to evaluate '
+             'them on every request (default: HIREFIRE_SNAPSHOT_INTERVAL '
+             'or %(default)s)')
+    parser_serve.add_argument(
+        '--snapshot-max-age', type=float,
+        default=env_float('HIREFIRE_SNAPSHOT_MAX_AGE'),
+        help='seconds after which a snapshot is evaluated again on request '
+             '(default: HIREFIRE_SNAPSHOT_MAX_AGE or no limit)')
+    parser_serve.set_defaults(func=serve)
+
+    parser_info = subparsers.add_parser(
+        'info', help='print the JSON of the info page',
+        description='Evaluate the procs once and print the JSON HireFire '
+                    'gets from the info page.')
+    add_procs_argument(parser_info)
+    parser_info.set_defaults(func=info)
+
+    parser_profile = subparsers.add_parser(
+        'profile', help='profile each proc',
+        description='Evaluate each proc --runs times and report its latency '
+                    'percentiles, broker round-trips and time spent waiting '
+                    'for Celery inspect replies.')
+    add_procs_argument(parser_profile)
+    add_runs_arguments(parser_profile)
+    parser_profile.set_defaults(func=profile)
+
+    parser_bench = subparsers.add_parser(
+        'bench', help='compare sequential and concurrent evaluation',
+        description='Evaluate all procs --runs times sequentially, '
+                    'concurrently in threads and on an event loop, and '
+                    'report the latency percentiles of each.')
+    add_procs_argument(parser_bench)
+    add_runs_arguments(parser_bench)
+    parser_bench.set_defaults(func=bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level,
+                        format='%(asctime)s %(levelname)s %(name)s: '
+                               '%(message)s')
+    return args.func(parser, args)
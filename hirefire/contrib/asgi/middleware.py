@@ -0,0 +1,156 @@
+from __future__ import absolute_import
+
+import re
+
+from hirefire import metrics
+from hirefire.procs import async_dump_procs, HIREFIRE_FOUND
+from hirefire.queuetime import get_queue_time, record_queue_time
+from hirefire.snapshot import LazyProcs, SnapshotUnavailable
+
+
+__all__ = ['HireFireMiddleware', 'QueueTimeMiddleware']
+
+
+async def send_response(send, status, body=b'', content_type=None,
+                        headers=()):
+    response_headers = [(b'content-length', str(len(body)).encode('ascii'))]
+    if content_type is not None:
+        response_headers.append((b'content-type', content_type))
+    response_headers.extend(headers)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': response_headers,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class HireFireMiddleware(object):
+    """
+    The ASGI middleware that is hardwired to the URL paths HireFire
+    requires, evaluating the procs on the event loop and passing other
+    requests on to the wrapped ``app``.
+    """
+    test_path = re.compile(r'^/hirefire/test/?$')
+
+    def __init__(self, app=None, token='development', procs=(),
+                 snapshot_interval=None, snapshot_max_age=None,
+                 snapshot_sync_fallback=True, snapshot_store=None,
+                 warmup=False):
+        if not procs:
+            raise ValueError('The HireFire ASGI middleware '
+                             'requires at least one proc defined.')
+        self.app = app
+        self.info_path = re.compile(r'^/hirefire/%s/info/?$' %
+                                    re.escape(token))
+        self.metrics_path = re.compile(r'^/hirefire/%s/metrics/?$' %
+                                       re.escape(token))
+        self._lazy_procs = LazyProcs(
+            procs,
+            snapshot_interval=snapshot_interval,
+            snapshot_max_age=snapshot_max_age,
+            snapshot_sync_fallback=snapshot_sync_fallback,
+            snapshot_store=snapshot_store,
+            warmup=warmup,
+        )
+
+    @property
+    def loaded_procs(self):
+        """
+        The procs, loaded on first access.
+        """
+        return self._lazy_procs.procs()
+
+    @property
+    def snapshot_poller(self):
+        return self._lazy_procs.snapshot_poller()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            path = scope['path']
+            if path.startswith('/hirefire/'):
+                if self.test_path.match(path):
+                    return await self.test(send)
+                elif self.info_path.match(path):
+                    return await self.info(send)
+                elif self.metrics_path.match(path):
+                    return await self.metrics(send)
+
+        if self.app is not None:
+            await self.app(scope, receive, send)
+        elif scope['type'] == 'http':
+            await send_response(send, 404)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await send({'type': 'websocket.close'})
+
+    async def lifespan(self, receive, send):
+        """
+        Complete the start-up and shutdown of the server when there's no
+        app to do it.
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def test(self, send):
+        """
+        Doesn't do much except telling the HireFire bot it's installed.
+        """
+        await send_response(send, 200, HIREFIRE_FOUND.encode('utf-8'),
+                            b'text/plain; charset=utf-8')
+
+    async def info(self, send):
+        """
+        Return JSON response serializing all proc names and quantities.
+        """
+        headers = []
+        if self.snapshot_poller is None:
+            payload = await async_dump_procs(self.loaded_procs)
+            payload = payload.encode('utf-8')
+        else:
+            try:
+                snapshot = await self.snapshot_poller.aget()
+            except SnapshotUnavailable:
+                return await send_response(send, 503)
+            payload = snapshot.payload
+            name, value = snapshot.age_header
+            headers.append((name.lower().encode('latin-1'),
+                            value.encode('latin-1')))
+        await send_response(send, 200, payload, b'application/json',
+                            headers)
+
+    async def metrics(self, send):
+        """
+        Return the metrics of the proc evaluations in the Prometheus
+        text format.
+        """
+        await send_response(send, 200,
+                            metrics.registry.render().encode('utf-8'),
+                            metrics.CONTENT_TYPE.encode('ascii'))
+
+
+class QueueTimeMiddleware(object):
+    """
+    The ASGI middleware that outputs Heroku request queue times to stdout.
+
+    Wrap the application with it as early as possible so that request
+    queue time is calculated as accurately as possible.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            for name, value in scope['headers']:
+                if name == b'x-request-start':
+                    queue_time_ms = get_queue_time(value.decode('latin-1'))
+                    if queue_time_ms is not None:
+                        record_queue_time(queue_time_ms)
+                    break
+        await self.app(scope, receive, send)
@@ -0,0 +1,10 @@
+"""
+Like ``hirefire.contrib.django.urls``, but serving the info page with
+the async :func:`~hirefire.contrib.django.views.ainfo` view.
+"""
+from __future__ import absolute_import
+
+from . import views
+from .urls import hirefire_patterns
+
+urlpatterns = hirefire_patterns(views.ainfo)
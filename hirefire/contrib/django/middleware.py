@@ -17,26 +17,97 @@ except ImportError:
     # https://docs.djangoproject.com/en/1.10/topics/http/middleware/#upgrading-pre-django-1-10-style-middleware
     MiddlewareMixin = object
 
+from hirefire import metrics
 from hirefire.procs import (
-    load_procs, serialize_procs, ProcSerializer, HIREFIRE_FOUND
+    async_serialize_procs, configure_executor, load_procs, serialize_procs,
+    warm_up, ProcSerializer, HIREFIRE_FOUND
 )
+from hirefire.queuetime import get_queue_time, record_queue_time
+from hirefire.snapshot import (
+    FileSnapshotStore, RedisSnapshotStore, SnapshotPoller, SnapshotUnavailable
+)
+from hirefire.utils import Lazy
 
 
 def setting(name, default=None):
     return os.environ.get(name, getattr(settings, name, None)) or default
 
 
+def is_enabled(value):
+    return str(value).lower() not in ('0', 'false', 'no', 'off')
+
+
 logger = getLogger('hirefire')
 
 TOKEN = setting('HIREFIRE_TOKEN', 'development')
 PROCS = setting('HIREFIRE_PROCS', [])
 USE_CONCURRENCY = setting('HIREFIRE_USE_CONCURRENCY', False)
+TIMEOUT = setting('HIREFIRE_TIMEOUT')
+PROC_TIMEOUT = setting('HIREFIRE_PROC_TIMEOUT')
+MAX_WORKERS = setting('HIREFIRE_MAX_WORKERS')
+SNAPSHOT_INTERVAL = setting('HIREFIRE_SNAPSHOT_INTERVAL')
+SNAPSHOT_MAX_AGE = setting('HIREFIRE_SNAPSHOT_MAX_AGE')
+SNAPSHOT_SYNC_FALLBACK = setting('HIREFIRE_SNAPSHOT_SYNC_FALLBACK', 'true')
+SNAPSHOT_STORE = setting('HIREFIRE_SNAPSHOT_STORE', 'memory')
+SNAPSHOT_DIR = setting('HIREFIRE_SNAPSHOT_DIR')
+WARMUP = setting('HIREFIRE_WARMUP', 'false')
+SNAPSHOT_REDIS_URL = setting('HIREFIRE_SNAPSHOT_REDIS_URL',
+                             os.environ.get('REDIS_URL'))
+
+ASYNC_SERIALIZE_KWARGS = {
+    'timeout': float(TIMEOUT) if TIMEOUT else None,
+    'proc_timeout': float(PROC_TIMEOUT) if PROC_TIMEOUT else None,
+}
+SERIALIZE_KWARGS = dict(ASYNC_SERIALIZE_KWARGS,
+                        use_concurrency=USE_CONCURRENCY)
 
 if not PROCS:
     raise ImproperlyConfigured('The HireFire Django middleware '
                                'requires at least one proc defined '
                                'in the HIREFIRE_PROCS setting.')
 
+if SNAPSHOT_STORE not in ('memory', 'file', 'redis'):
+    raise ImproperlyConfigured('The HIREFIRE_SNAPSHOT_STORE setting must be '
+                               'one of "memory", "file" or "redis", not %r.' %
+                               SNAPSHOT_STORE)
+
+if SNAPSHOT_STORE == 'redis' and not SNAPSHOT_REDIS_URL:
+    raise ImproperlyConfigured('The "redis" HIREFIRE_SNAPSHOT_STORE requires '
+                               'the HIREFIRE_SNAPSHOT_REDIS_URL setting.')
+
+if MAX_WORKERS:
+    configure_executor(max_workers=int(MAX_WORKERS))
+
+
+def build_snapshot_store(procs):
+    """
+    Return the snapshot store selected with ``HIREFIRE_SNAPSHOT_STORE``,
+    ``None`` for the default in-memory one.
+    """
+    if SNAPSHOT_STORE == 'file':
+        return FileSnapshotStore.for_procs(procs, directory=SNAPSHOT_DIR)
+    if SNAPSHOT_STORE == 'redis':
+        return RedisSnapshotStore.from_url(SNAPSHOT_REDIS_URL, procs)
+    return None
+
+
+def build_snapshot_poller(procs):
+    """
+    Return the snapshot poller of the given procs when
+    ``HIREFIRE_SNAPSHOT_INTERVAL`` is set, ``None`` otherwise.
+    """
+    if not SNAPSHOT_INTERVAL:
+        return None
+    return SnapshotPoller(
+        procs,
+        interval=float(SNAPSHOT_INTERVAL),
+        max_age=float(SNAPSHOT_MAX_AGE) if SNAPSHOT_MAX_AGE else None,
+        sync_fallback=is_enabled(SNAPSHOT_SYNC_FALLBACK),
+        store=build_snapshot_store(procs),
+        serializer_class=DjangoProcSerializer,
+        **SERIALIZE_KWARGS
+    )
+
 
 class DjangoProcSerializer(ProcSerializer):
     """
@@ -44,7 +115,10 @@ class DjangoProcSerializer(ProcSerializer):
 
     New threads in Django will open a new connection automatically once
     ``django.db`` is imported but they do not close the connection if a
-    thread is terminated.
+    thread is terminated. The worker threads of the shared executor are
+    long-lived, so like at the end of a request, connections are only
+    closed when they are unusable or older than ``CONN_MAX_AGE``, also
+    for the procs :meth:`acall` evaluates in those threads.
     """
 
     def __call__(self, args):
@@ -54,36 +128,141 @@ class DjangoProcSerializer(ProcSerializer):
             from django.db import close_old_connections
             close_old_connections()
 
+    async def acall(self, args):
+        name, proc = args
+        if name in self.redis_results:
+            # Prefetched, there's no database query to run on the loop.
+            return ProcSerializer.__call__(self, args)
+        return await super(DjangoProcSerializer, self).acall(args)
+
 
 class HireFireMiddleware(MiddlewareMixin):
     """
     The Django middleware that is hardwired to the URL paths
     HireFire requires. Implements the test response and the
     json response that contains the procs data.
+
+    The procs are loaded on the first request, or in a background
+    thread when the middleware is created if ``HIREFIRE_WARMUP``
+    is set.
     """
+    #: The prefix of all paths the middleware answers.
+    prefix = '/hirefire/'
+    sync_capable = True
+    async_capable = True
     test_path = re.compile(r'^/hirefire/test/?$')
     info_path = re.compile(r'^/hirefire/%s/info/?$' % re.escape(TOKEN))
-    loaded_procs = load_procs(*PROCS)
+    metrics_path = re.compile(r'^/hirefire/%s/metrics/?$' % re.escape(TOKEN))
+    loaded_procs = Lazy(lambda: load_procs(*PROCS))
+    snapshot_poller = Lazy(
+        lambda: build_snapshot_poller(HireFireMiddleware.loaded_procs))
+
+    def __init__(self, *args, **kwargs):
+        super(HireFireMiddleware, self).__init__(*args, **kwargs)
+        if is_enabled(WARMUP):
+            warm_up(lambda: self.loaded_procs)
+
+    def __call__(self, request):
+        # Most requests aren't for HireFire, return the response of the
+        # next middleware, or its coroutine in async mode, right away.
+        if not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        return super(HireFireMiddleware, self).__call__(request)
+
+    async def __acall__(self, request):
+        path = request.path
+        if self.test_path.match(path):
+            return self.test(request)
+
+        elif self.info_path.match(path):
+            return await self.ainfo(request)
+
+        elif self.metrics_path.match(path):
+            return self.metrics(request)
+
+        return await self.get_response(request)
 
-    def test(self, request):
+    @classmethod
+    def test(cls, request):
         """
         Doesn't do much except telling the HireFire bot it's installed.
         """
         return HttpResponse(HIREFIRE_FOUND)
 
-    def info(self, request):
+    @classmethod
+    def info(cls, request):
         """
         Return JSON response serializing all proc names and quantities.
+
+        Serves the latest snapshot when ``HIREFIRE_SNAPSHOT_INTERVAL``
+        is set, with its age in seconds in the
+        ``X-HireFire-Snapshot-Age`` header.
         """
-        data = serialize_procs(
-            self.loaded_procs,
-            use_concurrency=USE_CONCURRENCY,
-            serializer_class=DjangoProcSerializer,
-        )
-        return JsonResponse(data=data, safe=False)
+        if cls.snapshot_poller is None:
+            # Concurrent requests share one evaluation of the procs.
+            data = serialize_procs(
+                cls.loaded_procs,
+                serializer_class=DjangoProcSerializer,
+                coalesce=True,
+                **SERIALIZE_KWARGS
+            )
+            return JsonResponse(data=data, safe=False)
+
+        try:
+            snapshot = cls.snapshot_poller.get()
+        except SnapshotUnavailable as e:
+            logger.warning('%s', e)
+            return HttpResponse(status=503)
+        return cls.snapshot_response(snapshot)
+
+    @classmethod
+    async def ainfo(cls, request):
+        """
+        Like :meth:`info`, but evaluates the procs on the running event
+        loop with :func:`~hirefire.procs.async_serialize_procs`.
+        """
+        if cls.snapshot_poller is None:
+            # Concurrent requests share one evaluation of the procs.
+            data = await async_serialize_procs(
+                cls.loaded_procs,
+                serializer_class=DjangoProcSerializer,
+                coalesce=True,
+                **ASYNC_SERIALIZE_KWARGS
+            )
+            return JsonResponse(data=data, safe=False)
+
+        try:
+            snapshot = await cls.snapshot_poller.aget()
+        except SnapshotUnavailable as e:
+            logger.warning('%s', e)
+            return HttpResponse(status=503)
+        return cls.snapshot_response(snapshot)
+
+    @classmethod
+    def snapshot_response(cls, snapshot):
+        """
+        Return the response serving the snapshot, with its age in seconds
+        in the ``X-HireFire-Snapshot-Age`` header.
+        """
+        response = HttpResponse(snapshot.payload,
+                                content_type='application/json')
+        name, value = snapshot.age_header
+        response[name] = value
+        return response
+
+    @classmethod
+    def metrics(cls, request):
+        """
+        Return the metrics of the proc evaluations in the Prometheus
+        text format.
+        """
+        return HttpResponse(metrics.registry.render(),
+                            content_type=metrics.CONTENT_TYPE)
 
     def process_request(self, request):
         path = request.path
+        if not path.startswith(self.prefix):
+            return None
 
         if self.test_path.match(path):
             return self.test(request)
@@ -91,6 +270,9 @@ class HireFireMiddleware(MiddlewareMixin):
         elif self.info_path.match(path):
             return self.info(request)
 
+        elif self.metrics_path.match(path):
+            return self.metrics(request)
+
 
 class QueueTimeMiddleware(MiddlewareMixin):
     """
@@ -105,27 +287,7 @@ class QueueTimeMiddleware(MiddlewareMixin):
         """
         request_start_header_value = request.META.get("HTTP_X_REQUEST_START")
         if request_start_header_value is not None:
-            try:
-                request_start_timestamp_ms = int(request_start_header_value)
-            except ValueError:
-                logger.warning(
-                    'Received an invalid "X-Request-Start" header value from '
-                    'Heroku: "%s"',
-                    request_start_header_value,
-                )
-            else:
-                # The timestamp generated by timestamp() is the number of
-                # seconds since the Unix epoch, so it needs to be multiplied
-                # and truncated as an integer to convert it to milliseconds
-                now_timestamp_ms = int(timezone.now().timestamp() * 1000)
-
-                # There may be some clock drift between the Heroku router and
-                # the dyno that is running this middleware; if the calculated
-                # queue time is negative, treat it as zero instead
-                queue_time_ms = (
-                    now_timestamp_ms - request_start_timestamp_ms
-                    if now_timestamp_ms >= request_start_timestamp_ms
-                    else 0
-                )
-
-                print("[hirefire:router] queue={}ms".format(queue_time_ms))
+            queue_time_ms = get_queue_time(request_start_header_value,
+                                           timezone.now().timestamp())
+            if queue_time_ms is not None:
+                record_queue_time(queue_time_ms)
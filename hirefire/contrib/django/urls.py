@@ -0,0 +1,38 @@
+"""
+The URLconf of the HireFire views, to include at the end of the
+project's URLconf instead of adding the ``HireFireMiddleware``, so that
+other requests are resolved without checking its patterns::
+
+    urlpatterns = [
+        # ...
+        path('', include('hirefire.contrib.django.urls')),
+    ]
+
+Include ``hirefire.contrib.django.async_urls`` instead when the project
+is served with ASGI, to evaluate the procs on the event loop.
+"""
+from __future__ import absolute_import
+
+import re
+
+from django.urls import re_path
+
+from . import views
+from .middleware import TOKEN
+
+
+def hirefire_patterns(info_view):
+    """
+    Return the URL patterns of the HireFire views, using ``info_view``
+    for the info page.
+    """
+    return [
+        re_path(r'^hirefire/test/?$', views.test, name='hirefire-test'),
+        re_path(r'^hirefire/%s/info/?$' % re.escape(TOKEN), info_view,
+                name='hirefire-info'),
+        re_path(r'^hirefire/%s/metrics/?$' % re.escape(TOKEN),
+                views.metrics, name='hirefire-metrics'),
+    ]
+
+
+urlpatterns = hirefire_patterns(views.info)
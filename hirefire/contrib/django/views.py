@@ -0,0 +1,33 @@
+from __future__ import absolute_import
+
+from .middleware import HireFireMiddleware
+
+
+def test(request):
+    """
+    Doesn't do much except telling the HireFire bot it's installed.
+    """
+    return HireFireMiddleware.test(request)
+
+
+def info(request):
+    """
+    Return JSON response serializing all proc names and quantities.
+    """
+    return HireFireMiddleware.info(request)
+
+
+async def ainfo(request):
+    """
+    Like :func:`info`, but evaluates the procs on the running event loop,
+    for projects served with ASGI.
+    """
+    return await HireFireMiddleware.ainfo(request)
+
+
+def metrics(request):
+    """
+    Return the metrics of the proc evaluations in the Prometheus
+    text format.
+    """
+    return HireFireMiddleware.metrics(request)
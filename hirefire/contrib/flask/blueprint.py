@@ -3,21 +3,43 @@ from http import HTTPStatus
 
 from flask import abort, Blueprint, Response
 
-from hirefire.procs import load_procs, dump_procs, HIREFIRE_FOUND
+from hirefire import metrics as hirefire_metrics
+from hirefire.procs import dump_procs, HIREFIRE_FOUND
+from hirefire.snapshot import LazyProcs, SnapshotUnavailable
 
 
 __all__ = ['build_hirefire_blueprint']
 
 
-def build_hirefire_blueprint(token, procs):
+def build_hirefire_blueprint(token, procs, snapshot_interval=None,
+                             snapshot_max_age=None,
+                             snapshot_sync_fallback=True,
+                             snapshot_store=None, warmup=False):
     """
     The Flask middleware provided as a Blueprint exposing the the URL paths
     HireFire requires. Implements the test response and the json response
     that contains the procs data.
+
+    Pass ``snapshot_interval`` (in seconds) to serve the procs data from
+    a snapshot refreshed in the background instead of querying the
+    brokers on every request, see :class:`~hirefire.snapshot.SnapshotPoller`.
+    Pass a shared ``snapshot_store`` such as
+    :class:`~hirefire.snapshot.FileSnapshotStore` to have only one
+    worker process refresh it.
+
+    The procs are loaded on the first request, or right away in a
+    background thread with ``warmup``.
     """
     if not procs:
         raise RuntimeError('At least one proc should be passed')
-    loaded_procs = load_procs(*procs)
+    lazy_procs = LazyProcs(
+        procs,
+        snapshot_interval=snapshot_interval,
+        snapshot_max_age=snapshot_max_age,
+        snapshot_sync_fallback=snapshot_sync_fallback,
+        snapshot_store=snapshot_store,
+        warmup=warmup,
+    )
     bp = Blueprint('hirefire', __name__)
 
     @bp.route('/hirefire/test')
@@ -37,6 +59,28 @@ def build_hirefire_blueprint(token, procs):
         if secret != token:
             abort(HTTPStatus.NOT_FOUND)
 
-        return Response(dump_procs(loaded_procs), mimetype='application/json')
+        snapshot_poller = lazy_procs.snapshot_poller()
+        if snapshot_poller is None:
+            return Response(dump_procs(lazy_procs.procs()),
+                            mimetype='application/json')
+
+        try:
+            snapshot = snapshot_poller.get()
+        except SnapshotUnavailable:
+            abort(HTTPStatus.SERVICE_UNAVAILABLE)
+        response = Response(snapshot.payload, mimetype='application/json')
+        name, value = snapshot.age_header
+        response.headers[name] = value
+        return response
+
+    @bp.route('/hirefire/<secret>/metrics')
+    def metrics(secret):
+        """
+        The metrics of the proc evaluations in the Prometheus text format.
+        """
+        if secret != token:
+            abort(HTTPStatus.NOT_FOUND)
+        return Response(hirefire_metrics.registry.render(),
+                        content_type=hirefire_metrics.CONTENT_TYPE)
 
     return bp
@@ -3,22 +3,51 @@ import re
 
 import tornado.web
 
-from hirefire.procs import load_procs, dump_procs, HIREFIRE_FOUND
+from hirefire import metrics
+from hirefire.procs import async_dump_procs, HIREFIRE_FOUND
+from hirefire.snapshot import LazyProcs, SnapshotUnavailable
 
 
 __all__ = ['hirefire_handlers']
 
 
-def hirefire_handlers(token, procs):
+def hirefire_handlers(token, procs, snapshot_interval=None,
+                      snapshot_max_age=None, snapshot_sync_fallback=True,
+                      snapshot_store=None, warmup=False):
+    """
+    Return the handlers for the URL paths HireFire requires.
+
+    Pass ``snapshot_interval`` (in seconds) to serve the procs data from
+    a snapshot refreshed in the background instead of querying the
+    brokers on every request, see :class:`~hirefire.snapshot.SnapshotPoller`.
+    Pass a shared ``snapshot_store`` such as
+    :class:`~hirefire.snapshot.FileSnapshotStore` to have only one
+    process refresh it.
+
+    The procs are loaded on the first request, or right away in a
+    background thread with ``warmup``.
+    """
     if not procs:
         raise Exception('The HireFire Tornado handler '
                         'requires at least one proc defined.')
     test_path = r'^/hirefire/test/?$'
     info_path = r'^/hirefire/%s/info/?$' % re.escape(token)
-    HireFireInfoHandler.loaded_procs = load_procs(*procs)
+    metrics_path = r'^/hirefire/%s/metrics/?$' % re.escape(token)
+    lazy_procs = LazyProcs(
+        procs,
+        snapshot_interval=snapshot_interval,
+        snapshot_max_age=snapshot_max_age,
+        snapshot_sync_fallback=snapshot_sync_fallback,
+        snapshot_store=snapshot_store,
+        warmup=warmup,
+    )
+    # Lazy class attributes, loaded on first access.
+    HireFireInfoHandler.loaded_procs = lazy_procs.procs
+    HireFireInfoHandler.snapshot_poller = lazy_procs.snapshot_poller
     handlers = [
         (test_path, HireFireTestHandler),
-        (info_path, HireFireInfoHandler)
+        (info_path, HireFireInfoHandler),
+        (metrics_path, HireFireMetricsHandler),
     ]
     return handlers
 
@@ -47,20 +76,46 @@ class HireFireInfoHandler(tornado.web.RequestHandler):
     data.
     """
     loaded_procs = []
+    snapshot_poller = None
 
-    def info(self):
+    async def dump(self):
+        if self.snapshot_poller is None:
+            return await async_dump_procs(self.loaded_procs)
+        snapshot = await self.snapshot_poller.aget()
+        self.set_header(*snapshot.age_header)
+        return snapshot.dump()
+
+    async def info(self):
         """
         The heart of the app, returning a JSON ecoded list
         of proc results.
+
+        The procs are evaluated with
+        :func:`~hirefire.procs.async_dump_procs`, so other requests
+        are served meanwhile.
         """
         # do the JSON dumping ourselves to be able to handle datetimes nicely
-        payload = dump_procs(self.loaded_procs).replace("</", "<\\/")
+        try:
+            payload = (await self.dump()).replace("</", "<\\/")
+        except SnapshotUnavailable:
+            raise tornado.web.HTTPError(503)
         self.set_header("Content-Type", "application/json; charset=UTF-8")
         self.write(payload)
         self.finish()
 
-    def get(self):
-        self.info()
+    async def get(self):
+        await self.info()
 
-    def post(self):
-        self.info()
+    async def post(self):
+        await self.info()
+
+
+class HireFireMetricsHandler(tornado.web.RequestHandler):
+    """
+    RequestHandler that implements the metrics response, in the
+    Prometheus text format.
+    """
+    def get(self):
+        self.set_header('Content-Type', metrics.CONTENT_TYPE)
+        self.write(metrics.registry.render())
+        self.finish()
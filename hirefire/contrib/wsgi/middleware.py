@@ -0,0 +1,135 @@
+from __future__ import absolute_import
+
+import re
+
+from hirefire import metrics
+from hirefire.procs import dump_procs, HIREFIRE_FOUND
+from hirefire.queuetime import get_queue_time, record_queue_time
+from hirefire.snapshot import LazyProcs, SnapshotUnavailable
+
+
+__all__ = ['HireFireMiddleware', 'QueueTimeMiddleware']
+
+FOUND_BODY = HIREFIRE_FOUND.encode('utf-8')
+
+STATUSES = {
+    200: '200 OK',
+    404: '404 Not Found',
+    503: '503 Service Unavailable',
+}
+
+
+def respond(start_response, status, body=b'', content_type=None,
+            headers=()):
+    response_headers = [('Content-Length', str(len(body)))]
+    if content_type is not None:
+        response_headers.append(('Content-Type', content_type))
+    response_headers.extend(headers)
+    start_response(STATUSES[status], response_headers)
+    return [body]
+
+
+class HireFireMiddleware(object):
+    """
+    The WSGI middleware that is hardwired to the URL paths HireFire
+    requires, passing other requests on to the wrapped ``app``.
+    """
+    test_path = re.compile(r'^/hirefire/test/?$')
+
+    def __init__(self, app=None, token='development', procs=(),
+                 snapshot_interval=None, snapshot_max_age=None,
+                 snapshot_sync_fallback=True, snapshot_store=None,
+                 warmup=False):
+        if not procs:
+            raise ValueError('The HireFire WSGI middleware '
+                             'requires at least one proc defined.')
+        self.app = app
+        self.info_path = re.compile(r'^/hirefire/%s/info/?$' %
+                                    re.escape(token))
+        self.metrics_path = re.compile(r'^/hirefire/%s/metrics/?$' %
+                                       re.escape(token))
+        self._lazy_procs = LazyProcs(
+            procs,
+            snapshot_interval=snapshot_interval,
+            snapshot_max_age=snapshot_max_age,
+            snapshot_sync_fallback=snapshot_sync_fallback,
+            snapshot_store=snapshot_store,
+            warmup=warmup,
+        )
+
+    @property
+    def loaded_procs(self):
+        """
+        The procs, loaded on first access.
+        """
+        return self._lazy_procs.procs()
+
+    @property
+    def snapshot_poller(self):
+        return self._lazy_procs.snapshot_poller()
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith('/hirefire/'):
+            if self.test_path.match(path):
+                return self.test(start_response)
+            elif self.info_path.match(path):
+                return self.info(start_response)
+            elif self.metrics_path.match(path):
+                return self.metrics(start_response)
+
+        if self.app is None:
+            return respond(start_response, 404)
+        return self.app(environ, start_response)
+
+    def test(self, start_response):
+        """
+        Doesn't do much except telling the HireFire bot it's installed.
+        """
+        return respond(start_response, 200, FOUND_BODY,
+                       'text/plain; charset=utf-8')
+
+    def info(self, start_response):
+        """
+        Return JSON response serializing all proc names and quantities.
+        """
+        headers = []
+        if self.snapshot_poller is None:
+            payload = dump_procs(self.loaded_procs).encode('utf-8')
+        else:
+            try:
+                snapshot = self.snapshot_poller.get()
+            except SnapshotUnavailable:
+                return respond(start_response, 503)
+            payload = snapshot.payload
+            headers.append(snapshot.age_header)
+        return respond(start_response, 200, payload, 'application/json',
+                       headers)
+
+    def metrics(self, start_response):
+        """
+        Return the metrics of the proc evaluations in the Prometheus
+        text format.
+        """
+        return respond(start_response, 200,
+                       metrics.registry.render().encode('utf-8'),
+                       metrics.CONTENT_TYPE)
+
+
+class QueueTimeMiddleware(object):
+    """
+    The WSGI middleware that outputs Heroku request queue times to stdout.
+
+    Wrap the application with it as early as possible so that request
+    queue time is calculated as accurately as possible.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        request_start = environ.get('HTTP_X_REQUEST_START')
+        if request_start is not None:
+            queue_time_ms = get_queue_time(request_start)
+            if queue_time_ms is not None:
+                record_queue_time(queue_time_ms)
+        return self.app(environ, start_response)
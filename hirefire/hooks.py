@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+
+import threading
+from logging import getLogger
+
+__all__ = ('EVENTS', 'register', 'unregister', 'call')
+
+logger = getLogger('hirefire')
+
+#: The events hooks can be registered for, called with these
+#: keyword arguments:
+#:
+#: ``before_serialize``
+#:     ``procs``, ``cache``
+#: ``before_proc``
+#:     ``name``, ``proc``, ``cache``
+#: ``after_proc``
+#:     ``name``, ``proc``, ``cache``, ``quantity``, ``duration``
+#: ``on_error``
+#:     ``name``, ``proc``, ``cache``, ``error``, ``duration``
+#: ``after_serialize``
+#:     ``procs``, ``cache``, ``data``, ``duration``
+#:
+#: ``cache`` is the dictionary shared by the procs of one evaluation, and
+#: ``duration`` the number of seconds it took. Hooks must accept
+#: ``**kwargs``, to allow for future extensions.
+EVENTS = ('before_serialize', 'before_proc', 'after_proc', 'on_error',
+          'after_serialize')
+
+_hooks = dict((event, ()) for event in EVENTS)
+_lock = threading.Lock()
+
+#: Whether any hook is registered, checked before calling them so
+#: that they cost close to nothing when there is none.
+enabled = False
+
+
+def register(event, hook=None):
+    """
+    Register a hook called on the given event (see :data:`EVENTS`)
+    of every proc evaluation, e.g. to log slow procs::
+
+        from hirefire import hooks
+
+        @hooks.register('after_proc')
+        def log_slow_procs(name, duration, **kwargs):
+            if duration > 1:
+                logger.warning('The proc %s took %.3fs', name, duration)
+
+    """
+    global enabled
+    if event not in _hooks:
+        raise ValueError('Unknown hook event %r, expected one of %s' %
+                         (event, ', '.join(EVENTS)))
+    if hook is None:
+        return lambda hook: register(event, hook)
+    with _lock:
+        _hooks[event] = _hooks[event] + (hook,)
+        enabled = True
+    return hook
+
+
+def unregister(event, hook):
+    """
+    Unregister a hook registered with :func:`register`.
+    """
+    global enabled
+    with _lock:
+        _hooks[event] = tuple(registered for registered in _hooks[event]
+                              if registered is not hook)
+        enabled = any(_hooks.values())
+
+
+def call(event, **kwargs):
+    """
+    Call the hooks registered for the given event. Failing hooks are
+    logged, they don't fail the evaluation of the procs.
+    """
+    for hook in _hooks[event]:
+        try:
+            hook(**kwargs)
+        except Exception:
+            logger.exception('The HireFire %s hook %r failed', event, hook)
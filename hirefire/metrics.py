@@ -0,0 +1,258 @@
+from __future__ import absolute_import
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+__all__ = ('Counter', 'Gauge', 'Histogram', 'Registry', 'registry',
+           'CONTENT_TYPE')
+
+#: The content type of :meth:`Registry.render`.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+#: The default upper bounds of the buckets of histograms, in seconds.
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, value.replace('\\', r'\\')
+                                 .replace('\n', r'\n')
+                                 .replace('"', r'\"'))
+        for name, value in pairs)
+
+
+class Metric(object):
+    """
+    The base metric class, holding one value per combination of values
+    of its ``labelnames``.
+    """
+    #: The Prometheus type of the metric.
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError('The metric %s requires the labels %r, got %r' %
+                             (self.name, self.labelnames, sorted(labels)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels):
+        """
+        Return the current value for the given labels, or ``None``.
+        """
+        return self._values.get(self._key(labels))
+
+    def clear(self):
+        """
+        Forget all values.
+        """
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """
+        Yield the ``(name, label pairs, value)`` samples of the metric.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for name, pairs, value in self.samples():
+            lines.append('%s%s %s' % (name, format_labels(pairs),
+                                      format_value(value)))
+        return lines
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. the number of errors.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, e.g. the last quantity of a proc.
+    """
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observed values, e.g. durations, in buckets.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1),
+                                             0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the number of seconds the block took.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def get(self, **labels):
+        """
+        Return the ``(count, sum)`` of the values observed for the given
+        labels, or ``None``.
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return None
+            return sum(state[0]), state[1]
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total))
+                            for key, (counts, total) in self._values.items())
+        bounds = self.buckets + (float('inf'),)
+        for key, (counts, total) in values:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       pairs + [('le', format_value(float(bound)))],
+                       cumulative)
+            yield self.name + '_sum', pairs, total
+            yield self.name + '_count', pairs, cumulative
+
+
+class Registry(object):
+    """
+    A collection of metrics, rendered together in the Prometheus
+    text format, e.g.::
+
+        errors = registry.counter('myapp_errors_total', 'Errors.', ['proc'])
+        errors.inc(proc='worker')
+        registry.render()
+
+    """
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(list(self._metrics.values()))
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError('The metric %s is already registered as %r' %
+                                 (name, metric))
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation,
+                                   labelnames, buckets=buckets)
+
+    def clear(self):
+        """
+        Forget the values of all metrics.
+        """
+        for metric in self:
+            metric.clear()
+
+    def render(self):
+        """
+        Return all metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in self:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+#: The registry of the metrics recorded by hirefire.
+registry = Registry()
+
+proc_duration = registry.histogram(
+    'hirefire_proc_duration_seconds',
+    'The time it took to evaluate each proc.', ['proc'])
+proc_errors = registry.counter(
+    'hirefire_proc_errors_total',
+    'The number of failed evaluations of each proc.', ['proc'])
+proc_deadline_misses = registry.counter(
+    'hirefire_proc_deadline_misses_total',
+    'The number of times each proc missed its deadline.', ['proc'])
+proc_quantity = registry.gauge(
+    'hirefire_proc_quantity',
+    'The last quantity of each proc.', ['proc'])
+serialize_duration = registry.histogram(
+    'hirefire_serialize_duration_seconds',
+    'The time it took to evaluate all procs.')
+broker_round_trips = registry.counter(
+    'hirefire_broker_round_trips_total',
+    'The number of requests made to the brokers.', ['broker', 'operation'])
+celery_inspect_duration = registry.histogram(
+    'hirefire_celery_inspect_duration_seconds',
+    'The time it took to inspect the Celery workers.', ['method'])
+celery_inspect_missing_replies = registry.counter(
+    'hirefire_celery_inspect_missing_replies_total',
+    'The number of Celery inspect calls no worker replied to.', ['method'])
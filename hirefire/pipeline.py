@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from . import metrics
+
+__all__ = ('RedisPipeline', 'connection_key', 'execute_queries')
+
+
+def connection_key(connection):
+    """
+    Return a key identifying the Redis server and database the given
+    :class:`redis.Redis` client connects to, so that clients created
+    separately with the same parameters share a pipeline.
+    """
+    pool = getattr(connection, 'connection_pool', None)
+    kwargs = getattr(pool, 'connection_kwargs', None)
+    if not kwargs:
+        return id(connection)
+    return (type(pool).__name__,) + tuple(sorted(
+        (key, repr(value)) for key, value in kwargs.items()
+        if key in ('host', 'port', 'db', 'path', 'username')
+    ))
+
+
+class RedisPipeline(object):
+    """
+    Collects the Redis queries of several procs and runs them in
+    one pipeline, that is one round-trip, per Redis server, e.g.::
+
+        pipeline = RedisPipeline()
+        pipeline.add('worker', [(redis, 'llen', ('default',))])
+        pipeline.add('other', [(redis, 'llen', ('other',))])
+        pipeline.execute()  # {'worker': [3], 'other': [0]}
+
+    The queries are tuples of a :class:`redis.Redis` client, the name of
+    the command method and its arguments, as returned by
+    :meth:`~hirefire.procs.Proc.redis_queries`.
+    """
+    def __init__(self):
+        self.groups = OrderedDict()
+        self.sizes = OrderedDict()
+
+    def __len__(self):
+        return len(self.groups)
+
+    def add(self, name, queries):
+        """
+        Add the queries of the given proc name.
+        """
+        self.sizes[name] = len(queries)
+        for index, (connection, command, args) in enumerate(queries):
+            key = connection_key(connection)
+            if key not in self.groups:
+                self.groups[key] = (connection, [])
+            self.groups[key][1].append((name, index, command, args))
+
+    def execute(self):
+        """
+        Run the queries and return a dictionary mapping each proc name
+        to the list of results of its queries, in the order they were
+        added.
+        """
+        results = OrderedDict(
+            (name, [None] * size) for name, size in self.sizes.items())
+        for connection, queries in self.groups.values():
+            pipe = connection.pipeline(transaction=False)
+            for name, index, command, args in queries:
+                getattr(pipe, command)(*args)
+            metrics.broker_round_trips.inc(broker='redis',
+                                           operation='pipeline')
+            for (name, index, command, args), result in zip(queries,
+                                                             pipe.execute()):
+                results[name][index] = result
+        return results
+
+
+def execute_queries(queries):
+    """
+    Run the given Redis queries in as few round-trips as possible
+    and return their results, in the same order.
+    """
+    pipeline = RedisPipeline()
+    pipeline.add(None, queries)
+    return pipeline.execute()[None]
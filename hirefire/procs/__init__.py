@@ -1,20 +1,157 @@
+import asyncio
+import atexit
+import functools
 import json
 import os
+import threading
+import time
 import warnings
+import weakref
 from collections import OrderedDict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures.thread import _worker
+from logging import getLogger
 
 import six
 
-from ..utils import import_attribute, TimeAwareJSONEncoder
+from .. import hooks, metrics
+from ..pipeline import RedisPipeline
+from ..utils import (
+    AsyncSingleFlight, SingleFlight, import_attribute, TimeAwareJSONEncoder,
+)
 
 __all__ = (
     'loaded_procs', 'Proc', 'load_proc', 'load_procs', 'dump_procs',
-    'serialize_procs', 'ProcSerializer',
+    'serialize_procs', 'ProcSerializer', 'async_dump_procs',
+    'async_serialize_procs', 'get_executor',
+    'configure_executor', 'shutdown_executor', 'warm_up',
 )
 
+logger = getLogger('hirefire')
+
+
+def _float_from_env(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+def _int_from_env(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def _bool_from_env(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+
 HIREFIRE_FOUND = 'HireFire Middleware Found!'
 USE_CONCURRENCY = os.environ.get('HIREFIRE_USE_CONCURRENCY', False)
+TIMEOUT = _float_from_env('HIREFIRE_TIMEOUT')
+PROC_TIMEOUT = _float_from_env('HIREFIRE_PROC_TIMEOUT')
+MAX_WORKERS = _int_from_env('HIREFIRE_MAX_WORKERS')
+REDIS_PIPELINE = _bool_from_env('HIREFIRE_REDIS_PIPELINE', True)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# The futures of the procs evaluated in the executor with a deadline
+# by id, a proc that missed one isn't submitted again until it's done.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class _DaemonThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A :class:`~concurrent.futures.ThreadPoolExecutor` whose worker
+    threads are daemons that :mod:`concurrent.futures` doesn't join when
+    the interpreter exits, so that procs hanging past their deadline
+    don't hold up the shutdown of the process.
+    """
+
+    def _adjust_thread_count(self):
+        # Like ThreadPoolExecutor._adjust_thread_count, without adding the
+        # thread to concurrent.futures.thread._threads_queues.
+        idle_semaphore = getattr(self, '_idle_semaphore', None)
+        if idle_semaphore is not None and idle_semaphore.acquire(timeout=0):
+            return
+
+        def weakref_cb(_, q=self._work_queue):
+            q.put(None)
+
+        num_threads = len(self._threads)
+        if num_threads < self._max_workers:
+            thread = threading.Thread(
+                name='%s_%d' % (self._thread_name_prefix or self,
+                                num_threads),
+                target=_worker,
+                args=(weakref.ref(self, weakref_cb), self._work_queue,
+                      self._initializer, self._initargs),
+            )
+            thread.daemon = True
+            thread.start()
+            self._threads.add(thread)
+
+
+def get_executor():
+    """
+    Return the process-wide executor used to evaluate procs concurrently.
+
+    It's created on first use and reused across requests, so its worker
+    threads (and the connections they hold) outlive a single request.
+    Its size defaults to the ``HIREFIRE_MAX_WORKERS`` environment variable,
+    see :func:`~hirefire.procs.configure_executor`.
+    """
+    global _executor
+    executor = _executor
+    if executor is not None:
+        return executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _DaemonThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix='hirefire')
+        return _executor
+
+
+def configure_executor(max_workers=None):
+    """
+    Set the number of worker threads of the process-wide executor,
+    replacing the current executor if there is one.
+    """
+    global MAX_WORKERS
+    MAX_WORKERS = max_workers
+    shutdown_executor(wait=False)
+
+
+def shutdown_executor(wait=True):
+    """
+    Shut down the process-wide executor, a new one is created
+    when it's needed again.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _reset_executor_after_fork():
+    # The worker threads don't survive a fork, so don't reuse the
+    # executor (or a lock that may have been held) in the child.
+    global _executor, _executor_lock, _in_flight, _in_flight_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _in_flight = {}
+    _in_flight_lock = threading.Lock()
+
+
+# Don't wait for hanging procs when the process exits, the worker
+# threads are daemons.
+atexit.register(shutdown_executor, wait=False)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executor_after_fork)
 
 
 class Procs(OrderedDict):
@@ -42,6 +179,26 @@ def load_proc(obj):
     raise ValueError('The proc %r could not be loaded' % obj)
 
 
+def warm_up(procs):
+    """
+    Loads the procs and prepares them (see
+    :meth:`~hirefire.procs.Proc.warm_up`) in a background thread, given
+    a callable returning them such as a :class:`~hirefire.utils.Lazy`,
+    and returns the thread.
+    """
+    def run():
+        try:
+            for proc in procs().values():
+                proc.warm_up()
+        except Exception:
+            logger.exception('Warming up the HireFire procs failed')
+
+    thread = threading.Thread(target=run, name='hirefire-warmup')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
 def load_procs(*procs):
     """
     Given a list of dotted import paths or Proc subclasses
@@ -73,46 +230,435 @@ class ProcSerializer(object):
     """
     def __init__(self):
         self.cache = {}
+        self.redis_results = {}
 
     def __call__(self, args):
         name, proc = args
+        if hooks.enabled:
+            hooks.call('before_proc', name=name, proc=proc, cache=self.cache)
+        start = time.monotonic()
         try:
-            quantity = proc.quantity(cache=self.cache)
-        except TypeError:
-            quantity = proc.quantity()
+            results = self.redis_results.get(name)
+            if results is not None:
+                quantity = proc.quantity_from_redis(results)
+            else:
+                try:
+                    quantity = proc.quantity(cache=self.cache)
+                except TypeError:
+                    quantity = proc.quantity()
+        except Exception as e:
+            self.error(name, proc, e, start)
+            raise
+        return self.result(name, proc, quantity, start)
+
+    async def acall(self, args):
+        """
+        Like calling the serializer, but awaits the proc's
+        :meth:`~hirefire.procs.Proc.aquantity` if it implements it, or
+        calls the serializer in the shared executor otherwise.
+        """
+        name, proc = args
+        if name in self.redis_results:
+            return self(args)
+        if type(proc).aquantity is Proc.aquantity:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_executor(), self, args)
+        if hooks.enabled:
+            hooks.call('before_proc', name=name, proc=proc, cache=self.cache)
+        start = time.monotonic()
+        try:
+            quantity = await proc.aquantity(cache=self.cache)
+        except Exception as e:
+            self.error(name, proc, e, start)
+            raise
+        return self.result(name, proc, quantity, start)
+
+    def result(self, name, proc, quantity, start):
+        """
+        Record the quantity the proc returned in time, evaluated
+        since ``start``, and transform it.
+        """
+        duration = time.monotonic() - start
+        metrics.proc_duration.observe(duration, proc=name)
+        metrics.proc_quantity.set(quantity or 0, proc=name)
+        if hooks.enabled:
+            hooks.call('after_proc', name=name, proc=proc, cache=self.cache,
+                       quantity=quantity, duration=duration)
+        proc.last_quantity = quantity
         return {
             'name': name,
             'quantity': quantity or 0,
         }
 
+    def error(self, name, proc, error, start):
+        """
+        Record the error the proc raised, evaluated since ``start``.
+        """
+        metrics.proc_errors.inc(proc=name)
+        if hooks.enabled:
+            hooks.call('on_error', name=name, proc=proc, cache=self.cache,
+                       error=error, duration=time.monotonic() - start)
+
+    def done(self, procs, data, start):
+        """
+        Record the evaluation of all procs since ``start``.
+        """
+        duration = time.monotonic() - start
+        metrics.serialize_duration.observe(duration)
+        if hooks.enabled:
+            hooks.call('after_serialize', procs=procs, cache=self.cache,
+                       data=data, duration=duration)
+
+    def stale(self, args):
+        """
+        Transform a proc that missed its deadline, reporting the
+        last quantity it returned in time.
+        """
+        name, proc = args
+        metrics.proc_deadline_misses.inc(proc=name)
+        logger.warning('The proc %r missed its deadline, reporting its '
+                       'last known quantity (stale): %r',
+                       name, proc.last_quantity)
+        return {
+            'name': name,
+            'quantity': proc.last_quantity or 0,
+        }
+
+    def prefetch(self, procs):
+        """
+        Run the :meth:`~hirefire.procs.Proc.redis_queries` of all procs
+        in one :class:`~hirefire.pipeline.RedisPipeline`, so the procs
+        are then serialized from the results.
+
+        If that fails, the procs are evaluated one by one as usual.
+        """
+        pipeline = RedisPipeline()
+        try:
+            for name, proc in procs.items():
+                if not _pipelined(proc):
+                    continue
+                queries = proc.redis_queries()
+                if queries:
+                    pipeline.add(name, queries)
+            if len(pipeline):
+                self.redis_results = pipeline.execute()
+        except Exception:
+            logger.exception('Running the Redis queries of the procs '
+                             'in a pipeline failed')
+
+
+def _pipelined(proc):
+    """
+    Whether the proc's :meth:`~hirefire.procs.Proc.redis_queries` can be
+    run in the pipeline, i.e. it has some and its ``quantity`` isn't
+    overridden by a subclass of the class implementing them, so that
+    :meth:`~hirefire.procs.Proc.quantity_from_redis` computes the same.
+    """
+    cls = type(proc)
+    for base in cls.__mro__:
+        if 'redis_queries' in vars(base):
+            return base is not Proc and cls.quantity is base.quantity
+    return False
+
+
+def _remaining(start, limits):
+    if not limits:
+        return None
+    return max(start + min(limits) - time.monotonic(), 0)
+
+
+def _until(deadline):
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
+
+
+def _deadline(start, timeout, proc_timeout, procs):
+    """
+    Returns the time by which all procs need to be evaluated: ``timeout``
+    seconds from the ``start``, or else enough for every proc and the
+    Redis pipeline to take ``proc_timeout`` seconds one after the other,
+    so that procs queued behind hanging ones in the executor don't wait
+    forever to start.
+    """
+    if timeout is not None:
+        return start + timeout
+    if proc_timeout is not None:
+        return start + proc_timeout * (len(procs) + 1)
+    return None
+
+
+def _earliest(deadline, other):
+    return other if deadline is None else min(deadline, other)
+
+
+class _Evaluation(object):
+    """
+    The call of the serializer for one proc in the executor, which
+    records when it starts, to count the proc's ``proc_timeout`` from
+    there instead of from when it was queued.
+
+    ``started`` is a :class:`threading.Event`, or an asyncio future of
+    the given ``loop``.
+    """
+
+    def __init__(self, serializer, item, loop=None):
+        self.serializer = serializer
+        self.item = item
+        self.loop = loop
+        self.start = None
+        if loop is None:
+            self.started = threading.Event()
+        else:
+            self.started = loop.create_future()
+
+    def __call__(self):
+        self.start = time.monotonic()
+        if self.loop is None:
+            self.started.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._set_started)
+            except RuntimeError:
+                # The loop was closed after the proc missed its deadline.
+                pass
+        return self.serializer(self.item)
+
+    def _set_started(self):
+        if not self.started.done():
+            self.started.set_result(None)
+
+    def result(self, future, deadline, proc_timeout):
+        """
+        Returns the result of the ``future`` of the evaluation, waiting
+        until the ``deadline`` of all procs or for ``proc_timeout``
+        seconds from the start of the evaluation, whichever comes first.
+        """
+        if proc_timeout is not None:
+            if not self.started.wait(_until(deadline)):
+                raise TimeoutError
+            deadline = _earliest(deadline, self.start + proc_timeout)
+        return future.result(timeout=_until(deadline))
+
+
+def _submit(key, func, *args):
+    """
+    Submit ``func`` to the executor, unless the previous call submitted
+    for ``key`` is still running, e.g. a hanging proc that missed its
+    deadline. Returns ``None`` then, so it doesn't take one more worker
+    on every evaluation.
+    """
+    with _in_flight_lock:
+        if id(key) in _in_flight:
+            return None
+        future = _in_flight[id(key)] = get_executor().submit(func, *args)
+    future.add_done_callback(functools.partial(_forget, id(key)))
+    return future
+
+
+def _forget(key, future):
+    with _in_flight_lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+def _serialize_procs_with_deadlines(serializer, procs, deadline,
+                                   proc_timeout):
+    items = list(procs.items())
+    evaluations = [_Evaluation(serializer, item) for item in items]
+    futures = [_submit(item[1], evaluation)
+               for item, evaluation in zip(items, evaluations)]
+
+    data = []
+    for item, evaluation, future in zip(items, evaluations, futures):
+        if future is None:
+            data.append(serializer.stale(item))
+            continue
+        try:
+            data.append(evaluation.result(future, deadline, proc_timeout))
+        except TimeoutError:
+            future.cancel()
+            data.append(serializer.stale(item))
+    return data
+
+
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
 
 def serialize_procs(procs, use_concurrency=USE_CONCURRENCY,
-                    serializer_class=ProcSerializer):
+                    serializer_class=ProcSerializer,
+                    timeout=TIMEOUT, proc_timeout=PROC_TIMEOUT,
+                    redis_pipeline=REDIS_PIPELINE, coalesce=False):
     """
     Given a list of loaded procs, serialize the data for them into
     a list of dictionaries in the form expected by HireFire,
     ready to be encoded into JSON.
+
+    ``timeout`` is the total number of seconds to wait for all procs,
+    counted from the start of the call, and ``proc_timeout`` the number
+    of seconds to wait for each proc, counted from the start of its
+    evaluation (defaults to the ``HIREFIRE_TIMEOUT`` and
+    ``HIREFIRE_PROC_TIMEOUT`` environment variables). The Redis pipeline
+    counts as one evaluation, and without ``timeout`` all procs together
+    get ``proc_timeout`` seconds for each evaluation. A proc missing its
+    deadline reports the last quantity it returned in time instead.
+    Timeouts need the procs to be evaluated in worker threads, so when
+    one is given the procs are evaluated concurrently regardless of
+    ``use_concurrency``.
+
+    Procs are evaluated concurrently on the executor returned by
+    :func:`~hirefire.procs.get_executor`.
+
+    Unless ``redis_pipeline`` is false (or the ``HIREFIRE_REDIS_PIPELINE``
+    environment variable), the Redis queries of all procs are first run
+    in one pipeline per Redis server, see
+    :meth:`~hirefire.procs.Proc.redis_queries`.
+
+    With ``coalesce``, concurrent calls for the same procs and options
+    are collapsed into one, whose result they all return.
     """
-    serializer = serializer_class()
+    if coalesce:
+        options = (use_concurrency, serializer_class, timeout, proc_timeout,
+                   redis_pipeline)
+        return _single_flight(
+            (id(procs), options), serialize_procs, procs, *options)
 
-    if use_concurrency:
-        with ThreadPoolExecutor() as executor:
+    start = time.monotonic()
+    serializer = serializer_class()
+    limits = [limit for limit in (timeout, proc_timeout) if limit is not None]
+    if hooks.enabled:
+        hooks.call('before_serialize', procs=procs, cache=serializer.cache)
+
+    if redis_pipeline:
+        if limits:
+            future = _submit(procs, serializer.prefetch, procs)
+            try:
+                if future is None:
+                    raise TimeoutError
+                future.result(timeout=_remaining(start, limits))
+            except TimeoutError:
+                logger.warning('Running the Redis queries of the procs '
+                               'in a pipeline missed its deadline')
+        else:
+            serializer.prefetch(procs)
+
+    if limits:
+        deadline = _deadline(start, timeout, proc_timeout, procs)
+        data = _serialize_procs_with_deadlines(serializer, procs,
+                                               deadline, proc_timeout)
+    else:
+        if use_concurrency:
             # Execute all procs in parallel to avoid blocking IO
             # especially celery which needs to open a transport to AMQP.
-            proc_iterator = executor.map(serializer, procs.items())
-    else:
-        proc_iterator = map(serializer, procs.items())
+            proc_iterator = get_executor().map(serializer, procs.items())
+        else:
+            proc_iterator = map(serializer, procs.items())
+        # Return a list, since json.dumps does not support generators.
+        data = list(proc_iterator)
 
-    # Return a list, since json.dumps does not support generators.
-    return list(proc_iterator)
+    serializer.done(procs, data, start)
+    return data
 
 
 def dump_procs(procs):
     """
     Given a list of loaded procs dumps the data for them in
     JSON format.
+
+    Concurrent calls share one evaluation of the procs.
     """
-    data = serialize_procs(procs)
+    data = serialize_procs(procs, coalesce=True)
+    return json.dumps(data, cls=TimeAwareJSONEncoder, ensure_ascii=False)
+
+
+async def async_serialize_procs(procs, serializer_class=ProcSerializer,
+                                timeout=TIMEOUT, proc_timeout=PROC_TIMEOUT,
+                                redis_pipeline=REDIS_PIPELINE,
+                                coalesce=False):
+    """
+    Like :func:`~hirefire.procs.serialize_procs`, but evaluates
+    all procs at the same time on the running event loop.
+
+    Procs that don't implement :meth:`~hirefire.procs.Proc.aquantity`
+    are evaluated in the executor returned by
+    :func:`~hirefire.procs.get_executor`.
+    """
+    if coalesce:
+        options = (serializer_class, timeout, proc_timeout, redis_pipeline)
+        return await _async_single_flight(
+            (id(procs), options), async_serialize_procs, procs, *options)
+
+    start = time.monotonic()
+    serializer = serializer_class()
+    limits = [limit for limit in (timeout, proc_timeout) if limit is not None]
+    if hooks.enabled:
+        hooks.call('before_serialize', procs=procs, cache=serializer.cache)
+
+    loop = asyncio.get_running_loop()
+    if redis_pipeline and any(map(_pipelined, procs.values())):
+        if limits:
+            future = _submit(procs, serializer.prefetch, procs)
+            prefetch = future and asyncio.wrap_future(future)
+        else:
+            prefetch = loop.run_in_executor(get_executor(),
+                                            serializer.prefetch, procs)
+        try:
+            if prefetch is None:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(prefetch, _remaining(start, limits))
+        except asyncio.TimeoutError:
+            logger.warning('Running the Redis queries of the procs '
+                           'in a pipeline missed its deadline')
+
+    deadline = _deadline(start, timeout, proc_timeout, procs)
+
+    async def serialize(item):
+        if not limits:
+            return await serializer.acall(item)
+        name, proc = item
+        if (type(proc).aquantity is Proc.aquantity and
+                name not in serializer.redis_results):
+            # Evaluated in the executor, where missing the deadline
+            # doesn't stop it, see _submit().
+            evaluation = _Evaluation(serializer, item, loop)
+            future = _submit(proc, evaluation)
+            if future is None:
+                return serializer.stale(item)
+            call = asyncio.wrap_future(future)
+        else:
+            evaluation = None
+            call = asyncio.ensure_future(serializer.acall(item))
+        try:
+            proc_deadline = deadline
+            if proc_timeout is not None:
+                if evaluation is not None:
+                    await asyncio.wait_for(evaluation.started,
+                                           _until(deadline))
+                    proc_start = evaluation.start
+                else:
+                    proc_start = time.monotonic()
+                proc_deadline = _earliest(deadline,
+                                          proc_start + proc_timeout)
+            return await asyncio.wait_for(call, _until(proc_deadline))
+        except asyncio.TimeoutError:
+            call.cancel()
+            return serializer.stale(item)
+
+    data = list(await asyncio.gather(*map(serialize, procs.items())))
+    serializer.done(procs, data, start)
+    return data
+
+
+async def async_dump_procs(procs):
+    """
+    Like :func:`~hirefire.procs.dump_procs`, but using
+    :func:`~hirefire.procs.async_serialize_procs`.
+
+    Concurrent calls on the same event loop share one evaluation
+    of the procs.
+    """
+    data = await async_serialize_procs(procs, coalesce=True)
     return json.dumps(data, cls=TimeAwareJSONEncoder, ensure_ascii=False)
 
 
@@ -144,6 +690,10 @@ class Proc(object):
     #: The list of queues to check
     queues = []
 
+    #: The last quantity returned in time, reported when the proc
+    #: misses its deadline in :func:`~hirefire.procs.serialize_procs`.
+    last_quantity = None
+
     def __init__(self, name=None, queues=None):
         if name is not None:
             self.name = name
@@ -181,6 +731,55 @@ class Proc(object):
         """
         raise NotImplementedError
 
+    async def aquantity(self, **kwargs):
+        """
+        The asyncio variant of :meth:`~hirefire.procs.Proc.quantity`,
+        used by :func:`~hirefire.procs.async_serialize_procs`.
+
+        Implement it in a subclass when the queues can be checked
+        with an asyncio client, it takes the same ``kwargs``. By default
+        :meth:`~hirefire.procs.Proc.quantity` is called in the executor
+        returned by :func:`~hirefire.procs.get_executor`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(self.quantity, **kwargs))
+
+    def redis_queries(self):
+        """
+        Returns the Redis queries needed to compute the quantity,
+        as a list of ``(client, command, args)`` tuples, e.g.
+        ``[(redis, 'llen', ('default',))]``.
+
+        Procs returning queries have them run together with the queries
+        of the other procs by :func:`~hirefire.procs.serialize_procs`,
+        in one pipeline per Redis server, and their quantity is then
+        computed by :meth:`~hirefire.procs.Proc.quantity_from_redis`
+        instead of :meth:`~hirefire.procs.Proc.quantity`. That's skipped
+        for subclasses overriding ``quantity`` but not this method.
+
+        Returns an empty list by default.
+        """
+        return []
+
+    def quantity_from_redis(self, results):
+        """
+        Returns the aggregated number of tasks of the proc queues given
+        the results of the :meth:`~hirefire.procs.Proc.redis_queries`,
+        in the same order.
+
+        Sums the results by default.
+        """
+        return sum(results)
+
+    def warm_up(self):
+        """
+        Prepares what the proc builds lazily, like its clients, so that
+        the first request doesn't have to. Called by :func:`warm_up`.
+
+        Does nothing by default.
+        """
+
 
 class ClientProc(Proc):
     """
@@ -204,16 +803,49 @@ class ClientProc(Proc):
     See the implementation of the :class:`~hirefire.procs.rq.RQProc`
     class for an example.
 
+    The clients are created on first use of
+    :attr:`~hirefire.procs.ClientProc.clients`.
+
     """
+    _clients = None
 
     def __init__(self, *args, **kwargs):
         super(ClientProc, self).__init__(*args, **kwargs)
-        self.clients = []
+        # Per instance, so that building the clients of one proc doesn't
+        # wait for those of another.
+        self._clients_lock = threading.Lock()
+
+    @property
+    def clients(self):
+        """
+        The list of clients of the queues, created on first access.
+        """
+        if self._clients is None:
+            with self._clients_lock:
+                if self._clients is None:
+                    self._clients = self.build_clients()
+        return self._clients
+
+    @clients.setter
+    def clients(self, clients):
+        self._clients = clients
+
+    def build_clients(self):
+        """
+        Returns the clients of the queues, leaving out the queues
+        for which :meth:`~hirefire.procs.ClientProc.client` returns
+        ``None``.
+        """
+        clients = []
         for queue in self.queues:
             client = self.client(queue)
             if client is None:
                 continue
-            self.clients.append(client)
+            clients.append(client)
+        return clients
+
+    def warm_up(self):
+        self.clients
 
     def client(self, queue, *args, **kwargs):
         """
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from hotqueue import HotQueue
 
+from ..pipeline import execute_queries
 from . import ClientProc
 
 
@@ -60,4 +61,12 @@ class HotQueueProc(ClientProc):
         """
         Returns the aggregated number of tasks of the proc queues.
         """
-        return sum([len(client) for client in self.clients])
+        return self.quantity_from_redis(execute_queries(self.redis_queries()))
+
+    def redis_queries(self):
+        """
+        Returns the queries for the length of each queue.
+        """
+        # HotQueue keeps its Redis client in a private attribute.
+        return [(client._HotQueue__redis, 'llen', (client.key,))
+                for client in self.clients]
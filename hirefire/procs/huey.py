@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from huey.backends.redis_backend import RedisQueue, RedisBlockingQueue
 
+from ..pipeline import execute_queries
 from . import ClientProc
 
 
@@ -78,4 +79,11 @@ class HueyRedisProc(ClientProc):
         """
         Returns the aggregated number of tasks of the proc queues.
         """
-        return sum([len(client) for client in self.clients])
+        return self.quantity_from_redis(execute_queries(self.redis_queries()))
+
+    def redis_queries(self):
+        """
+        Returns the queries for the length of each queue.
+        """
+        return [(client.conn, 'llen', (client.queue_name,))
+                for client in self.clients]
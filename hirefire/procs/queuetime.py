@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+from .. import queuetime
+from . import Proc
+
+
+class QueueTimeProc(Proc):
+    """
+    A proc reporting a percentile of the Heroku request queue times of
+    the web process serving the info request, in milliseconds, as
+    recorded by the ``QueueTimeMiddleware`` of the contrib integrations.
+
+    Those of the other web processes of the dyno are included when
+    ``HIREFIRE_QUEUE_TIMES_DIR`` names a directory they share, e.g.
+    ``/dev/shm``. Those of the other dynos never are, with a
+    ``RedisSnapshotStore`` the dyno refreshing the snapshot reports its
+    own.
+
+    This lets HireFire scale web dynos on queue time through the info
+    page, without a log drain.
+
+    :param name: the name of the proc (required)
+    :param percentile: the percentile to report (optional)
+    :type name: str
+    :type percentile: int or float
+
+    Example::
+
+        from hirefire.procs.queuetime import QueueTimeProc
+
+        class WebQueueTimeProc(QueueTimeProc):
+            name = 'web'
+            percentile = 95
+
+    """
+    #: The name of the proc (required).
+    name = None
+
+    #: The queues aren't used, the queue times are those of the process.
+    queues = ['router']
+
+    #: The percentile of the queue times to report (optional).
+    percentile = 95
+
+    #: The histogram to read the queue times from (optional), defaults
+    #: to :data:`hirefire.queuetime.histogram`.
+    histogram = None
+
+    def __init__(self, percentile=None, histogram=None, *args, **kwargs):
+        super(QueueTimeProc, self).__init__(*args, **kwargs)
+        if percentile is not None:
+            self.percentile = percentile
+        if histogram is not None:
+            self.histogram = histogram
+
+    def quantity(self, **kwargs):
+        """
+        Returns the percentile of the queue times of the last minute in
+        milliseconds, or 0 when there were no requests.
+        """
+        histogram = self.histogram or queuetime.histogram
+        value = histogram.percentile(self.percentile)
+        if value is None:
+            return 0
+        return int(round(value))
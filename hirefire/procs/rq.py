@@ -1,9 +1,13 @@
 from __future__ import absolute_import
 
-from rq import Queue, Worker
-from rq.registry import StartedJobRegistry
-from rq.exceptions import NoSuchJobError
+import time
 
+from rq import Queue
+from rq.registry import (
+    DeferredJobRegistry, ScheduledJobRegistry, StartedJobRegistry,
+)
+
+from ..pipeline import execute_queries
 from . import ClientProc
 
 
@@ -26,6 +30,19 @@ class RQProc(ClientProc):
             name = 'worker'
             queues = ['high', 'default', 'low']
 
+    Besides the jobs waiting in the queues, the jobs that are currently
+    running (``started``) and the jobs that are scheduled to run in the
+    next ``scheduled_horizon`` seconds (``scheduled``) are counted. Jobs
+    waiting for other jobs to finish (``deferred``) can be counted, too.
+    All of them are counted in one round-trip to Redis. Configure what's
+    counted by overriding the ``count_statuses`` property, e.g.::
+
+        class WorkerRQProc(RQProc):
+            name = 'worker'
+            queues = ['high', 'default', 'low']
+            count_statuses = ['queued', 'started', 'scheduled', 'deferred']
+            scheduled_horizon = 60
+
     """
     #: The name of the proc (required).
     name = None
@@ -36,10 +53,19 @@ class RQProc(ClientProc):
     #: The connection to use for the queues (optional).
     connection = None
 
+    #: The job statuses to count (optional).
+    #: Valid options are 'queued', 'started', 'scheduled' and 'deferred'.
+    count_statuses = ['queued', 'started', 'scheduled']
+
+    #: The number of seconds from now in which scheduled jobs
+    #: need to be due to be counted (optional).
+    scheduled_horizon = 0
+
     def __init__(self, connection=None, *args, **kwargs):
-        super(RQProc, self).__init__(*args, **kwargs)
+        # The connection is needed to create the clients.
         if connection is not None:
             self.connection = connection
+        super(RQProc, self).__init__(*args, **kwargs)
 
     def client(self, queue):
         """
@@ -55,11 +81,48 @@ class RQProc(ClientProc):
         """
         Returns the aggregated number of tasks of the proc queues.
         """
-        count = 0
+        return self.quantity_from_redis(execute_queries(self.redis_queries()))
 
-        # Total count should be what's queued plus the started jobs.
-        for queue in self.clients:
-            registry = StartedJobRegistry(queue.name, queue.connection)
-            count += (queue.count + len(registry))
+    def redis_queries(self):
+        """
+        Returns the queries for the number of jobs of each queue with
+        one of the :attr:`~hirefire.procs.rq.RQProc.count_statuses`.
 
-        return count
+        The registries are read directly, without running their cleanup,
+        so only the started and deferred jobs that haven't expired yet
+        are counted, those kept without a TTL (scored -1) included.
+        """
+        statuses = set(self.count_statuses)
+        unknown = statuses - {'queued', 'started', 'scheduled', 'deferred'}
+        if unknown:
+            raise ValueError('Invalid job statuses: %s' %
+                             ', '.join(sorted(unknown)))
+        now = time.time()
+        due = now + self.scheduled_horizon
+
+        queries = []
+        for queue in self.clients:
+            connection = queue.connection
+            if 'queued' in statuses:
+                queries.append((connection, 'llen', (queue.key,)))
+            if 'started' in statuses:
+                key = StartedJobRegistry.key_template.format(queue.name)
+                queries.extend(self.unexpired_queries(connection, key, now))
+            if 'scheduled' in statuses:
+                key = ScheduledJobRegistry.key_template.format(queue.name)
+                queries.append((connection, 'zcount', (key, '-inf', due)))
+            if 'deferred' in statuses:
+                key = DeferredJobRegistry.key_template.format(queue.name)
+                queries.extend(self.unexpired_queries(connection, key, now))
+        return queries
+
+    @staticmethod
+    def unexpired_queries(connection, key, now):
+        """
+        Returns the queries for the number of entries of the registry
+        at ``key`` that expire after ``now`` or never.
+        """
+        return [
+            (connection, 'zcount', (key, now, '+inf')),
+            (connection, 'zcount', (key, -1, -1)),
+        ]
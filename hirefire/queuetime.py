@@ -0,0 +1,378 @@
+from __future__ import absolute_import
+
+import atexit
+import bisect
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from logging import getLogger
+
+__all__ = ('get_queue_time', 'log_queue_time', 'record_queue_time',
+           'BatchWriter', 'QueueTimeHistogram', 'histogram', 'writer')
+
+logger = getLogger('hirefire')
+
+
+class BatchWriter(object):
+    """
+    Writes lines to a stream from a background thread, in batches, so
+    that a slow stream doesn't slow down the threads writing to it.
+
+    Lines are written in the order they were added. When more than
+    ``max_lines`` are waiting, the oldest ones are dropped.
+
+    :param stream: the stream to write to, defaults to the current
+                   ``sys.stdout``
+    :param max_lines: the number of lines to keep at most
+    :param interval: the number of seconds to wait for more lines
+                     before writing a batch
+    """
+    def __init__(self, stream=None, max_lines=10000, interval=0.1):
+        self.stream = stream
+        self.interval = interval
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def write(self, line):
+        """
+        Add a line to be written, without blocking on the stream.
+        """
+        with self._condition:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(line)
+            if self._thread is None or self._pid != os.getpid():
+                self._start()
+            self._condition.notify()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.run,
+                                        name='hirefire-queuetime')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self.lines:
+                    self._condition.wait()
+            # Let more lines come in to write them together.
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing the queue times failed')
+
+    def flush(self):
+        """
+        Write the waiting lines now.
+        """
+        with self._flush_lock:
+            with self._condition:
+                lines = list(self.lines)
+                self.lines.clear()
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                logger.warning('Dropped %d queue time lines, the output '
+                               'is too slow', dropped)
+            if lines:
+                stream = self.stream or sys.stdout
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+
+    def reset(self):
+        """
+        Forget the waiting lines and the thread, e.g. after a fork.
+        """
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.lines.clear()
+        self.dropped = 0
+        self._thread = None
+
+
+class QueueTimeHistogram(object):
+    """
+    Counts the queue times of the last ``window`` seconds in buckets,
+    in a fixed amount of memory, to get their percentiles, e.g.::
+
+        histogram = QueueTimeHistogram(window=60)
+        histogram.add(120)
+        histogram.percentile(95)
+
+    The window moves by ``window / slots`` seconds at a time, and the
+    percentiles are interpolated within the buckets.
+
+    With a ``directory``, every process writes its counts to a file
+    there at most every ``publish_interval`` seconds after it recorded
+    queue times, and the counts and percentiles include those of the
+    other processes, e.g. of all the web workers of a dyno with
+    ``/dev/shm``.
+
+    :param window: the number of seconds to keep the queue times for
+    :param slots: the number of parts the window is divided into
+    :param buckets: the upper bounds of the buckets, in milliseconds
+    :param directory: the directory shared with the other processes
+                      (optional)
+    """
+    #: The default upper bounds of the buckets, in milliseconds.
+    default_buckets = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300,
+                       500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 30000)
+
+    #: The number of seconds between two writes of the counts of the
+    #: process to the shared ``directory``.
+    publish_interval = 1
+
+    #: The prefix of the names of the files in the shared ``directory``.
+    file_prefix = 'hirefire-queuetime-'
+
+    def __init__(self, window=60, slots=12, buckets=None, directory=None):
+        self.window = window
+        self.slots = slots
+        self.slot_seconds = float(window) / slots
+        self.buckets = tuple(buckets or self.default_buckets)
+        self.directory = directory
+        self._counts = [[0] * (len(self.buckets) + 1) for _ in range(slots)]
+        self._slot_ids = [None] * slots
+        self._published = None
+        self._publishing = False
+        self._lock = threading.Lock()
+
+    def _slot(self, now):
+        slot_id = int(now // self.slot_seconds)
+        index = slot_id % self.slots
+        if self._slot_ids[index] != slot_id:
+            # The slot is reused for a new part of the window.
+            self._slot_ids[index] = slot_id
+            self._counts[index] = [0] * (len(self.buckets) + 1)
+        return self._counts[index]
+
+    def add(self, queue_time_ms, now=None):
+        """
+        Count a queue time.
+        """
+        if now is None:
+            now = time.time()
+        index = bisect.bisect_left(self.buckets, queue_time_ms)
+        with self._lock:
+            self._slot(now)[index] += 1
+            if self.directory is None or self._publishing:
+                return
+            # Publish now, or once the interval since the last time is
+            # over, also if no other queue time comes in meanwhile.
+            self._publishing = True
+            delay = 0
+            if self._published is not None:
+                delay = (self._published + self.publish_interval -
+                         time.monotonic())
+        if delay > 0:
+            timer = threading.Timer(delay, self.publish)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.publish()
+
+    def path(self, pid=None):
+        """
+        Return the path of the file of the process ``pid`` (defaults to
+        the current one) in the shared ``directory``.
+        """
+        return os.path.join(self.directory, '%s%d.json' % (
+            self.file_prefix, os.getpid() if pid is None else pid))
+
+    def publish(self):
+        """
+        Write the counts of this process to its file in the shared
+        ``directory``, replacing it atomically.
+        """
+        with self._lock:
+            self._publishing = False
+            self._published = time.monotonic()
+            slots = [[slot_id, list(slot_counts)] for slot_id, slot_counts
+                     in zip(self._slot_ids, self._counts)
+                     if slot_id is not None]
+        value = json.dumps({'slot_seconds': self.slot_seconds,
+                            'buckets': self.buckets, 'slots': slots})
+        path = self.path()
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                prefix='.' + os.path.basename(path), dir=self.directory)
+            try:
+                with os.fdopen(fd, 'w') as fp:
+                    fp.write(value)
+                os.rename(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError):
+            logger.warning('Could not write the queue times to %s', path,
+                           exc_info=True)
+
+    def _shared_slots(self, first_slot_id):
+        """
+        Yield the slots of the window from the files of the other
+        processes, removing the files that are older than the window.
+        """
+        own_path = self.path()
+        pattern = os.path.join(self.directory, self.file_prefix + '*.json')
+        for path in glob.glob(pattern):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as fp:
+                    value = json.load(fp)
+            except (IOError, OSError, ValueError):
+                continue
+            if (value.get('slot_seconds') != self.slot_seconds or
+                    tuple(value.get('buckets', ())) != self.buckets):
+                continue
+            slots = [(slot_id, slot_counts)
+                     for slot_id, slot_counts in value.get('slots', ())
+                     if slot_id >= first_slot_id]
+            if not slots:
+                # The process stopped recording, or is gone.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            for slot in slots:
+                yield slot
+
+    def counts(self, now=None):
+        """
+        Return the number of queue times of the window in each bucket,
+        including those of the other processes with a ``directory``.
+        """
+        if now is None:
+            now = time.time()
+        first_slot_id = int(now // self.slot_seconds) - self.slots + 1
+        counts = [0] * (len(self.buckets) + 1)
+        with self._lock:
+            slots = [(slot_id, list(slot_counts)) for slot_id, slot_counts
+                     in zip(self._slot_ids, self._counts)]
+        if self.directory is not None:
+            slots.extend(self._shared_slots(first_slot_id))
+        for slot_id, slot_counts in slots:
+            if slot_id is not None and slot_id >= first_slot_id:
+                for index, count in enumerate(slot_counts):
+                    counts[index] += count
+        return counts
+
+    def percentile(self, percent, now=None):
+        """
+        Return the given percentile of the queue times of the window
+        in milliseconds, or ``None`` if there are none.
+        """
+        counts = self.counts(now)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = total * percent / 100.0
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return float(self.buckets[-1])
+
+    def reset(self):
+        with self._lock:
+            self._counts = [[0] * (len(self.buckets) + 1)
+                            for _ in range(self.slots)]
+            self._slot_ids = [None] * self.slots
+
+    def reset_after_fork(self):
+        """
+        Forget the queue times of the parent process in a forked child,
+        which records and publishes its own.
+        """
+        self._lock = threading.Lock()
+        self._published = None
+        self._publishing = False
+        self.reset()
+
+
+#: The histogram :func:`record_queue_time` adds to, read by
+#: :class:`~hirefire.procs.queuetime.QueueTimeProc`, shared with the
+#: other processes through the ``HIREFIRE_QUEUE_TIMES_DIR`` directory
+#: if that environment variable is set.
+histogram = QueueTimeHistogram(
+    directory=os.environ.get('HIREFIRE_QUEUE_TIMES_DIR') or None)
+
+#: The writer of :func:`log_queue_time`, flushed at exit.
+writer = BatchWriter()
+
+atexit.register(writer.flush)
+if hasattr(os, 'register_at_fork'):
+    # The lines were already written by the parent process.
+    os.register_at_fork(after_in_child=writer.reset)
+    os.register_at_fork(after_in_child=histogram.reset_after_fork)
+
+
+def get_queue_time(request_start, now=None):
+    """
+    Return the Heroku request queue time in milliseconds, given the value
+    of the ``X-Request-Start`` header, or ``None`` if it's invalid.
+
+    The behavior and format for request queue time scaling are described in
+    HireFire's docs: https://help.hirefire.io/article/49-logplex-queue-time
+    """
+    try:
+        request_start_timestamp_ms = int(request_start)
+    except ValueError:
+        logger.warning(
+            'Received an invalid "X-Request-Start" header value from '
+            'Heroku: "%s"',
+            request_start,
+        )
+        return None
+
+    # The timestamp generated by time() is the number of seconds since
+    # the Unix epoch, so it needs to be multiplied and truncated as an
+    # integer to convert it to milliseconds
+    if now is None:
+        now = time.time()
+    now_timestamp_ms = int(now * 1000)
+
+    # There may be some clock drift between the Heroku router and
+    # the dyno that is running this middleware; if the calculated
+    # queue time is negative, treat it as zero instead
+    return (
+        now_timestamp_ms - request_start_timestamp_ms
+        if now_timestamp_ms >= request_start_timestamp_ms
+        else 0
+    )
+
+
+def log_queue_time(queue_time_ms):
+    """
+    Outputs the Heroku request queue time to stdout, where it's picked
+    up by HireFire from the Heroku log drain.
+
+    The line is written by the background thread of :data:`writer`,
+    so a slow stdout doesn't delay the request.
+    """
+    writer.write("[hirefire:router] queue={}ms".format(queue_time_ms))
+
+
+def record_queue_time(queue_time_ms):
+    """
+    Outputs the Heroku request queue time with :func:`log_queue_time`
+    and adds it to the :data:`histogram` of this process.
+    """
+    histogram.add(queue_time_ms)
+    log_queue_time(queue_time_ms)
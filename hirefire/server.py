@@ -0,0 +1,190 @@
+from __future__ import absolute_import
+
+import asyncio
+import os
+from http import HTTPStatus
+from logging import getLogger
+from urllib.parse import unquote
+
+from hirefire.contrib.asgi.middleware import HireFireMiddleware
+from hirefire.snapshot import DEFAULT_INTERVAL
+
+__all__ = ['HireFireServer']
+
+logger = getLogger('hirefire')
+
+#: The largest request head (request line and headers) accepted, in bytes.
+MAX_HEAD_SIZE = 16384
+
+
+class BadRequest(Exception):
+    pass
+
+
+def status_line(status):
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    return ('HTTP/1.1 %d %s\r\n' % (status, reason)).encode('latin-1')
+
+
+class HireFireServer(object):
+    """
+    A small asyncio HTTP server answering the HireFire endpoints with the
+    ASGI :class:`~hirefire.contrib.asgi.middleware.HireFireMiddleware`.
+    """
+    #: The number of seconds to wait for the head of a request.
+    read_timeout = 10
+
+    def __init__(self, procs, token='development',
+                 snapshot_interval=DEFAULT_INTERVAL, snapshot_max_age=None,
+                 snapshot_sync_fallback=True, snapshot_store=None,
+                 read_timeout=None):
+        self.app = HireFireMiddleware(
+            token=token,
+            procs=procs,
+            snapshot_interval=snapshot_interval,
+            snapshot_max_age=snapshot_max_age,
+            snapshot_sync_fallback=snapshot_sync_fallback,
+            snapshot_store=snapshot_store,
+        )
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        self.server = None
+        self.path = None
+
+    async def start(self, host='127.0.0.1', port=8001, path=None):
+        """
+        Load the procs and start listening on the given ``host`` and
+        ``port``, or on the Unix socket at ``path`` if given.
+        """
+        # Fail on start-up instead of on the first request, and have a
+        # snapshot ready for it.
+        self.app.loaded_procs
+        if self.app.snapshot_poller is not None:
+            self.app.snapshot_poller.start()
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            self.path = path
+            self.server = await asyncio.start_unix_server(
+                self.handle, path, limit=MAX_HEAD_SIZE)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, host, port, limit=MAX_HEAD_SIZE)
+        for sock in self.server.sockets:
+            logger.info('Serving the HireFire endpoints on %s',
+                        sock.getsockname())
+        return self.server
+
+    async def serve(self, host='127.0.0.1', port=8001, path=None):
+        """
+        Start the server and serve until cancelled.
+        """
+        server = await self.start(host, port, path)
+        try:
+            await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        if self.app.snapshot_poller is not None:
+            self.app.snapshot_poller.stop()
+
+    async def read_scope(self, reader, writer):
+        """
+        Read the head of a request and return its ASGI scope.
+        """
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                          self.read_timeout)
+        except asyncio.LimitOverrunError:
+            raise BadRequest('The request head is too large')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise BadRequest('The request head is incomplete')
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise BadRequest('Invalid request line %r' % lines[0])
+        headers = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise BadRequest('Invalid header line %r' % line)
+            headers.append((name.strip().lower().encode('latin-1'),
+                            value.strip().encode('latin-1')))
+
+        path, _, query = target.partition('?')
+        sockname = writer.get_extra_info('sockname')
+        peername = writer.get_extra_info('peername')
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0', 'spec_version': '2.3'},
+            'http_version': version.partition('/')[2] or '1.1',
+            'method': method.upper(),
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'server': sockname if isinstance(sockname, tuple) else None,
+            'client': peername if isinstance(peername, tuple) else None,
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                scope = await self.read_scope(reader, writer)
+            except (BadRequest, asyncio.TimeoutError) as e:
+                logger.debug('Bad HireFire server request: %s', e)
+                writer.write(status_line(400) +
+                             b'content-length: 0\r\nconnection: close\r\n\r\n')
+                return
+            if scope is None:
+                return
+            await self.respond(scope, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, scope, writer):
+        """
+        Call the application with the request ``scope`` and write its
+        response.
+        """
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                head = [status_line(message['status'])]
+                for name, value in message.get('headers', ()):
+                    head.append(b'%s: %s\r\n' % (name, value))
+                head.append(b'connection: close\r\n\r\n')
+                writer.write(b''.join(head))
+            elif message['type'] == 'http.response.body':
+                if scope['method'] != 'HEAD':
+                    writer.write(message.get('body', b''))
+                if not message.get('more_body', False):
+                    await writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            logger.exception('The HireFire server failed to answer %s %s',
+                             scope['method'], scope['path'])
+            writer.write(status_line(500) +
+                         b'content-length: 0\r\nconnection: close\r\n\r\n')
@@ -0,0 +1,636 @@
+from __future__ import absolute_import
+
+import asyncio
+import errno
+import functools
+import hashlib
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from logging import getLogger
+
+from . import procs as hirefire_procs
+from .procs import async_serialize_procs, serialize_procs, warm_up
+from .utils import Lazy, TimeAwareJSONEncoder
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+__all__ = ('Snapshot', 'SnapshotPoller', 'SnapshotUnavailable',
+           'MemorySnapshotStore', 'FileSnapshotStore', 'RedisSnapshotStore',
+           'LazyProcs')
+
+logger = getLogger('hirefire')
+
+#: The default number of seconds between two snapshot refreshes.
+DEFAULT_INTERVAL = 5
+
+#: The response header with the age in seconds of the served snapshot.
+AGE_HEADER = 'X-HireFire-Snapshot-Age'
+
+_unset = object()
+
+
+class SnapshotUnavailable(Exception):
+    """
+    Raised when no snapshot fresh enough can be served.
+    """
+
+
+class Snapshot(object):
+    """
+    The serialized proc data at a given point in time, as taken
+    by the process ``origin``.
+    """
+    def __init__(self, data, timestamp=None, origin=None):
+        self.data = data
+        if timestamp is None:
+            timestamp = time.time()
+        self.timestamp = timestamp
+        if origin is None:
+            origin = current_origin()
+        self.origin = origin
+
+    def __repr__(self):
+        return '<Snapshot age=%.3fs>' % self.age
+
+    @property
+    def age(self):
+        """
+        The number of seconds since the snapshot was taken.
+        """
+        return max(0.0, time.time() - self.timestamp)
+
+    @property
+    def age_header(self):
+        """
+        The response header with the age of the snapshot, as a
+        ``(name, value)`` tuple.
+        """
+        return AGE_HEADER, '%.3f' % self.age
+
+    def dump(self):
+        """
+        Return the snapshot data in JSON format, like
+        :func:`~hirefire.procs.dump_procs`.
+        """
+        return json.dumps(self.data, cls=TimeAwareJSONEncoder,
+                          ensure_ascii=False)
+
+    @property
+    def payload(self):
+        """
+        The output of :meth:`~Snapshot.dump` encoded in UTF-8, encoded
+        once per snapshot.
+        """
+        payload = self.__dict__.get('_payload')
+        if payload is None:
+            payload = self._payload = self.dump().encode('utf-8')
+        return payload
+
+    def to_json(self):
+        """
+        Return the snapshot, including its timestamp, in JSON format.
+        """
+        return json.dumps({'timestamp': self.timestamp,
+                           'origin': self.origin, 'data': self.data},
+                          cls=TimeAwareJSONEncoder, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, value):
+        """
+        Load a snapshot from the output of :meth:`~Snapshot.to_json`.
+        """
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        value = json.loads(value)
+        return cls(value['data'], timestamp=value['timestamp'],
+                   origin=value.get('origin'))
+
+
+def current_origin():
+    """
+    Return an identifier of the current process, unique across hosts.
+    """
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def procs_key(procs):
+    """
+    Return a key identifying the given set of procs, the same in every
+    process that loaded them from the same configuration.
+    """
+    parts = []
+    for name, proc in sorted(procs.items()):
+        cls = type(proc)
+        parts.append([name, '%s.%s' % (cls.__module__, cls.__name__),
+                      list(proc.queues)])
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+class MemorySnapshotStore(object):
+    """
+    Keeps the snapshot in the memory of the current process.
+    """
+    def __init__(self):
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Return the stored snapshot, or ``None``.
+        """
+        return self.snapshot
+
+    def save(self, snapshot):
+        """
+        Replace the stored snapshot.
+        """
+        self.snapshot = snapshot
+
+    @contextmanager
+    def lock(self, blocking=True):
+        """
+        Become the one thread refreshing the snapshot, waiting for
+        the current refresh if there is one, yielding whether that
+        succeeded. Without ``blocking``, doesn't wait but yields
+        ``False`` when another thread is refreshing it.
+        """
+        if not self._lock.acquire(blocking):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self._lock.release()
+
+
+class FileSnapshotStore(object):
+    """
+    Shares the snapshot between the processes of a host through a file,
+    so that only one of the pre-forked web workers queries the brokers
+    while the others read its result, e.g.::
+
+        store = FileSnapshotStore.for_procs(loaded_procs)
+        poller = SnapshotPoller(loaded_procs, store=store)
+
+    The file is replaced atomically on every save, and refreshes are
+    serialized with an ``flock`` on a separate lock file.
+
+    :param path: the path of the snapshot file
+    """
+    def __init__(self, path):
+        if fcntl is None:  # pragma: no cover
+            raise RuntimeError('FileSnapshotStore requires fcntl')
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._cached = (None, None)
+
+    @classmethod
+    def for_procs(cls, procs, directory=None):
+        """
+        Return a store for the given procs in ``directory``, defaulting
+        to the shared memory directory when there is one.
+        """
+        if directory is None:
+            directory = default_directory()
+        return cls(os.path.join(directory,
+                                'hirefire-%s.json' % procs_key(procs)))
+
+    def load(self):
+        """
+        Return the stored snapshot, or ``None``. The file is only parsed
+        again after it was replaced.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        version = (stat.st_ino, stat.st_mtime, stat.st_size)
+        cached_version, snapshot = self._cached
+        if cached_version == version:
+            return snapshot
+        try:
+            with open(self.path, 'rb') as fp:
+                snapshot = Snapshot.from_json(fp.read())
+        except (IOError, OSError, ValueError, KeyError):
+            logger.warning('Could not read the HireFire snapshot file %s',
+                           self.path, exc_info=True)
+            return None
+        self._cached = (version, snapshot)
+        return snapshot
+
+    def save(self, snapshot):
+        """
+        Atomically replace the snapshot file.
+        """
+        directory, name = os.path.split(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + name, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(snapshot.to_json().encode('utf-8'))
+            os.rename(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def lock(self, blocking=False):
+        """
+        Try to take the lock file, yielding whether that succeeded.
+        Never blocks.
+        """
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                yield False
+            else:
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+class RedisSnapshotStore(object):
+    """
+    Shares the snapshot between all the web dynos through Redis, so that
+    only one of them queries the brokers per interval while the others
+    read its result, e.g.::
+
+        store = RedisSnapshotStore.for_procs(loaded_procs, redis.Redis())
+        poller = SnapshotPoller(loaded_procs, store=store)
+
+    The snapshot is kept under ``key`` and refreshes are serialized with
+    a lease on ``key + ':lock'`` that expires after ``lease_timeout``
+    seconds, in case its holder dies. Snapshot ages are computed with the
+    clocks of the dynos, which are expected to be in sync.
+
+    :param connection: the Redis client
+    :param key: the Redis key of the snapshot
+    :param lease_timeout: the number of seconds after which the lease
+                          of a refresh expires
+    """
+    #: The prefix of the Redis keys used by :meth:`for_procs`.
+    key_prefix = 'hirefire:snapshot:'
+
+    def __init__(self, connection, key='hirefire:snapshot', lease_timeout=30):
+        self.connection = connection
+        self.key = key
+        self.lock_key = key + ':lock'
+        self.lease_timeout = lease_timeout
+        self._cached = (None, None)
+
+    @classmethod
+    def for_procs(cls, procs, connection, **kwargs):
+        """
+        Return a store for the given procs on the given Redis connection.
+        """
+        return cls(connection, key=cls.key_prefix + procs_key(procs),
+                   **kwargs)
+
+    @classmethod
+    def from_url(cls, url, procs, **kwargs):
+        """
+        Return a store for the given procs on the Redis server at ``url``.
+        """
+        import redis
+        return cls.for_procs(procs, redis.Redis.from_url(url), **kwargs)
+
+    def load(self):
+        """
+        Return the stored snapshot, or ``None``. The value is only parsed
+        again after it was replaced.
+        """
+        value = self.connection.get(self.key)
+        if value is None:
+            return None
+        cached_value, snapshot = self._cached
+        if cached_value == value:
+            return snapshot
+        try:
+            snapshot = Snapshot.from_json(value)
+        except (ValueError, KeyError):
+            logger.warning('Could not read the HireFire snapshot %s',
+                           self.key, exc_info=True)
+            return None
+        self._cached = (value, snapshot)
+        return snapshot
+
+    def save(self, snapshot):
+        """
+        Replace the stored snapshot.
+        """
+        self.connection.set(self.key, snapshot.to_json())
+
+    @contextmanager
+    def lock(self, blocking=False):
+        """
+        Try to take the lease, yielding whether that succeeded.
+        Never blocks.
+        """
+        from redis.exceptions import LockError
+        lease = self.connection.lock(self.lock_key,
+                                     timeout=self.lease_timeout)
+        if not lease.acquire(blocking=False):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            try:
+                lease.release()
+            except LockError:
+                logger.warning('The HireFire snapshot lease %s expired '
+                               'before the refresh was done', self.lock_key)
+
+
+def default_directory():
+    """
+    Return ``/dev/shm`` when it is available, the temp directory otherwise.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class SnapshotPoller(object):
+    """
+    Keeps a recent :class:`Snapshot` of the given procs in memory,
+    refreshed by a background thread every ``interval`` seconds, e.g.::
+
+        poller = SnapshotPoller(loaded_procs, interval=5, max_age=30)
+        snapshot = poller.get()
+        snapshot.data  # what serialize_procs returned
+
+    The thread is started lazily on the first call to
+    :meth:`~SnapshotPoller.get`, and restarted if the process was forked
+    since, so it is safe to create pollers at import time in pre-forking
+    web servers.
+
+    :param procs: the loaded procs to serialize
+    :param interval: the number of seconds between two refreshes
+    :param max_age: the age in seconds after which a snapshot is not
+                    served anymore (optional, defaults to no limit)
+    :param sync_fallback: whether to serialize the procs in the
+                          requesting thread when there is no snapshot
+                          fresh enough to serve, instead of raising
+                          :class:`SnapshotUnavailable`
+    :param store: where the snapshot is kept, defaults to a
+                  :class:`MemorySnapshotStore`; pass a shared store such
+                  as :class:`FileSnapshotStore` to have only one process
+                  query the brokers while the others read its snapshots
+    :param serialize_kwargs: passed on to
+                             :func:`~hirefire.procs.serialize_procs`
+
+    """
+    def __init__(self, procs, interval=DEFAULT_INTERVAL, max_age=None,
+                 sync_fallback=True, store=None, **serialize_kwargs):
+        self.procs = procs
+        self.interval = interval
+        self.max_age = max_age
+        self.sync_fallback = sync_fallback
+        if store is None:
+            store = MemorySnapshotStore()
+        self.store = store
+        self.serialize_kwargs = serialize_kwargs
+        self._lock = threading.Lock()
+        self._async_locks = weakref.WeakKeyDictionary()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def snapshot(self):
+        """
+        The stored snapshot, or ``None``, also when the store failed.
+        """
+        try:
+            return self.store.load()
+        except Exception:
+            logger.warning('Could not load the HireFire snapshot from %r',
+                           self.store, exc_info=True)
+            return None
+
+    def save(self, snapshot):
+        """
+        Store the ``snapshot``, logging when the store failed.
+        """
+        try:
+            self.store.save(snapshot)
+        except Exception:
+            logger.warning('Could not save the HireFire snapshot to %r',
+                           self.store, exc_info=True)
+
+    @contextmanager
+    def lock(self, **kwargs):
+        """
+        Like the ``lock`` of the store, but yields ``False`` when the
+        store failed, so that the procs are evaluated locally instead.
+        """
+        try:
+            lock = self.store.lock(**kwargs)
+            acquired = lock.__enter__()
+        except Exception:
+            logger.warning('Could not lock the HireFire snapshot in %r',
+                           self.store, exc_info=True)
+            lock = None
+            acquired = False
+        if lock is None:
+            yield acquired
+            return
+        try:
+            yield acquired
+        except BaseException:
+            if not lock.__exit__(*sys.exc_info()):
+                raise
+        else:
+            try:
+                lock.__exit__(None, None, None)
+            except Exception:
+                logger.warning('Could not unlock the HireFire snapshot in '
+                               '%r', self.store, exc_info=True)
+
+    def refresh(self, outdated=_unset):
+        """
+        Serialize the procs and store the result as the current snapshot.
+
+        With a shared store, the snapshot of another process is used
+        instead when it is refreshing it right now, or has done so
+        less than ``interval`` seconds ago. When given the ``outdated``
+        snapshot to replace, a fresh snapshot that replaced it in the
+        meantime is used as well. When the store fails, the procs are
+        serialized without storing the result.
+        """
+        with self.lock() as acquired:
+            snapshot = self._shared(acquired, outdated)
+            if snapshot is not None:
+                return snapshot
+            kwargs = dict(self.serialize_kwargs)
+            kwargs.setdefault('coalesce', True)
+            snapshot = Snapshot(serialize_procs(self.procs, **kwargs))
+            if acquired:
+                self.save(snapshot)
+            return snapshot
+
+    async def arefresh(self, outdated=_unset):
+        """
+        Like :meth:`~SnapshotPoller.refresh`, but using
+        :func:`~hirefire.procs.async_serialize_procs`.
+
+        Never blocks the running event loop: the refreshes of its tasks
+        wait for each other on an :class:`asyncio.Lock`, and while
+        another thread is refreshing the snapshot, the procs are
+        serialized without storing the result.
+        """
+        loop = asyncio.get_running_loop()
+        async_lock = self._async_locks.get(loop)
+        if async_lock is None:
+            async_lock = self._async_locks[loop] = asyncio.Lock()
+        async with async_lock:
+            with self.lock(blocking=False) as acquired:
+                snapshot = self._shared(acquired, outdated)
+                if snapshot is not None:
+                    return snapshot
+                kwargs = dict(self.serialize_kwargs)
+                kwargs.pop('use_concurrency', None)
+                kwargs.setdefault('coalesce', True)
+                snapshot = Snapshot(
+                    await async_serialize_procs(self.procs, **kwargs))
+                if acquired:
+                    self.save(snapshot)
+                return snapshot
+
+    def _shared(self, acquired, outdated):
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        if outdated is not _unset and snapshot is not outdated:
+            # Replaced since the caller found it outdated.
+            return snapshot if self.is_fresh(snapshot) else None
+        if snapshot.origin == current_origin():
+            return None
+        if acquired:
+            # Refreshed by another process since our last save.
+            return snapshot if snapshot.age < self.interval else None
+        # Another process is refreshing it.
+        return snapshot if self.is_fresh(snapshot) else None
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Refreshing the HireFire snapshot failed')
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        """
+        Start the background thread unless it's already running
+        in the current process.
+        """
+        with self._lock:
+            pid = os.getpid()
+            if self._thread is not None and self._pid == pid:
+                return
+            self._stopped.clear()
+            self._pid = pid
+            self._thread = threading.Thread(target=self.run,
+                                            name='hirefire-snapshot')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread after its current refresh.
+        """
+        with self._lock:
+            self._stopped.set()
+            self._thread = None
+
+    def is_fresh(self, snapshot):
+        return (snapshot is not None and
+                (self.max_age is None or snapshot.age <= self.max_age))
+
+    def get(self):
+        """
+        Return the current snapshot.
+
+        Falls back to serializing the procs synchronously when the
+        snapshot is missing or older than ``max_age``, or raises
+        :class:`SnapshotUnavailable` if ``sync_fallback`` is off.
+        """
+        snapshot, outdated = self._get_fresh()
+        if snapshot is None:
+            snapshot = self.refresh(outdated)
+        return snapshot
+
+    async def aget(self):
+        """
+        Like :meth:`~SnapshotPoller.get`, but the fallback doesn't
+        block the running event loop.
+        """
+        snapshot, outdated = self._get_fresh()
+        if snapshot is None:
+            snapshot = await self.arefresh(outdated)
+        return snapshot
+
+    def _get_fresh(self):
+        self.start()
+        snapshot = self.snapshot
+        if self.is_fresh(snapshot):
+            return snapshot, None
+        if not self.sync_fallback:
+            raise SnapshotUnavailable('No HireFire snapshot fresh enough '
+                                      'to be served: %r' % snapshot)
+        return None, snapshot
+
+
+class LazyProcs(object):
+    """
+    The procs of an integration, loaded on first use, and the
+    :class:`SnapshotPoller` serving them if ``snapshot_interval`` is
+    given. Both are :class:`~hirefire.utils.Lazy`, e.g.::
+
+        lazy_procs = LazyProcs(['mysite.procs.WorkerProc'],
+                               snapshot_interval=5)
+        lazy_procs.procs()  # loads the procs
+        lazy_procs.snapshot_poller()  # None without snapshot_interval
+
+    With ``warmup``, the procs are loaded right away in a background
+    thread instead.
+    """
+    def __init__(self, procs, snapshot_interval=None, snapshot_max_age=None,
+                 snapshot_sync_fallback=True, snapshot_store=None,
+                 warmup=False):
+        self.procs = Lazy(functools.partial(hirefire_procs.load_procs,
+                                            *procs))
+        self.snapshot_poller = Lazy(lambda: None)
+        if snapshot_interval:
+            self.snapshot_poller = Lazy(lambda: SnapshotPoller(
+                self.procs(),
+                interval=snapshot_interval,
+                max_age=snapshot_max_age,
+                sync_fallback=snapshot_sync_fallback,
+                store=snapshot_store,
+            ))
+        if warmup:
+            warm_up(self.procs)
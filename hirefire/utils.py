@@ -1,8 +1,11 @@
+import asyncio
 import collections
 import datetime
 import decimal
 import json
 import sys
+import threading
+from concurrent.futures import Future
 
 
 def _resolve_name(name, package, level):
@@ -99,20 +102,131 @@ class TimeAwareJSONEncoder(json.JSONEncoder):
             return super(TimeAwareJSONEncoder, self).default(o)
 
 
+class SingleFlight(object):
+    """
+    Collapses concurrent calls for the same key into one: while a call
+    is in flight, other callers with the same key wait for it and share
+    its result (or exception), e.g.::
+
+        single_flight = SingleFlight()
+        single_flight('procs', serialize_procs, procs)
+
+    Unlike a cache, the result is forgotten once the call returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def __call__(self, key, func, *args, **kwargs):
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                calling = True
+            else:
+                calling = False
+
+        if not calling:
+            return pending.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+
+class AsyncSingleFlight(object):
+    """
+    Like :class:`SingleFlight`, but for coroutine functions, sharing
+    the calls made on the same event loop.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    async def __call__(self, key, func, *args, **kwargs):
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._pending[key] = task
+            task.add_done_callback(lambda task: self._pending.pop(key, None))
+        # Don't cancel the shared call when one of the callers is.
+        return await asyncio.shield(task)
+
+
 class KeyDefaultDict(collections.defaultdict):
     """
     A defaultdict where the default_factory can get the key as an arg.
+
+    It's safe to use from several threads: concurrent lookups of a
+    missing key wait for a single call of the ``default_factory``
+    and share its result (or exception).
     """
 
+    def __init__(self, *args, **kwargs):
+        super(KeyDefaultDict, self).__init__(*args, **kwargs)
+        self._single_flight = SingleFlight()
+
     def __missing__(self, key):
         """Attempt calling the factory with the key.
 
         If the normal methods don't work, try calling the
         ``default_factory`` with the key as an arg.
         """
+        return self._single_flight(key, self._set_default, key)
+
+    def _set_default(self, key):
+        # The value may have been set by a call that just finished.
+        if key in self:
+            return dict.__getitem__(self, key)
+        if self.default_factory is None:
+            raise KeyError(key)
         try:
-            return super(KeyDefaultDict, self).__missing__(key)
+            value = self.default_factory()
         except TypeError:
             value = self.default_factory(key)
-            self[key] = value
-            return value
+        self[key] = value
+        return value
+
+
+class Lazy(object):
+    """
+    Calls ``factory`` on first use only and keeps its result, e.g. to
+    load the procs on the first request instead of at import time::
+
+        get_procs = Lazy(functools.partial(load_procs, *procs))
+        get_procs()  # loads the procs
+        get_procs()  # returns the same procs
+
+    It's safe to use from several threads. Used as a class attribute,
+    it's replaced by the result of ``factory`` on access.
+    """
+    _unset = object()
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._value = self._unset
+
+    @property
+    def loaded(self):
+        return self._value is not self._unset
+
+    def __call__(self):
+        if self._value is self._unset:
+            with self._lock:
+                if self._value is self._unset:
+                    self._value = self.factory()
+        return self._value
+
+    def __get__(self, instance, owner):
+        return self()
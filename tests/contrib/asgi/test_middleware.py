@@ -0,0 +1,113 @@
+"""Tests for the ASGI middleware."""
+
+import asyncio
+import json
+
+import pytest
+
+from hirefire.contrib.asgi.middleware import (
+    HireFireMiddleware, QueueTimeMiddleware,
+)
+from hirefire.procs import HIREFIRE_FOUND, Proc, loaded_procs
+from hirefire.queuetime import writer
+
+
+class WorkerProc(Proc):
+    name = 'asgi_worker'
+    queues = ['default']
+
+    async def aquantity(self, **kwargs):
+        return 2
+
+
+async def downstream_app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': []})
+    await send({'type': 'http.response.body', 'body': b'downstream'})
+
+
+def request(app, path, headers=()):
+    messages = []
+    scope = {'type': 'http', 'method': 'GET', 'path': path,
+             'headers': list(headers)}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages[0]['status'], messages[1]['body']
+
+
+@pytest.fixture
+def app():
+    yield HireFireMiddleware(downstream_app, 'test', [WorkerProc()])
+    loaded_procs.pop(WorkerProc.name, None)
+
+
+class TestHireFireMiddleware:
+    def test_test_page(self, app):
+        assert request(app, '/hirefire/test') == (
+            200, HIREFIRE_FOUND.encode('utf-8'))
+
+    def test_info(self, app):
+        status, body = request(app, '/hirefire/test/info')
+        assert status == 200
+        assert {'name': 'asgi_worker', 'quantity': 2} in json.loads(body)
+
+        assert request(app, '/hirefire/garbage/info') == (200, b'downstream')
+
+    def test_metrics(self, app):
+        request(app, '/hirefire/test/info')
+        status, body = request(app, '/hirefire/test/metrics')
+        assert status == 200
+        assert (b'hirefire_proc_quantity{proc="asgi_worker"} 2' in
+                body.splitlines())
+
+    def test_passes_other_paths(self, app):
+        assert request(app, '/') == (200, b'downstream')
+
+
+class TestStandaloneHireFireMiddleware:
+    @pytest.fixture
+    def app(self):
+        yield HireFireMiddleware(None, 'test', [WorkerProc()])
+        loaded_procs.pop(WorkerProc.name, None)
+
+    def call(self, app, scope, messages):
+        sent = []
+        received = iter(messages)
+
+        async def receive():
+            return next(received)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(app(scope, receive, send))
+        return [message['type'] for message in sent]
+
+    def test_not_found(self, app):
+        assert request(app, '/') == (404, b'')
+
+    def test_lifespan(self, app):
+        assert self.call(app, {'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ]) == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+    def test_websocket(self, app):
+        assert self.call(app, {'type': 'websocket', 'path': '/'}, [
+            {'type': 'websocket.connect'},
+        ]) == ['websocket.close']
+
+
+class TestQueueTimeMiddleware:
+    def test_queue_time(self, capsys):
+        app = QueueTimeMiddleware(downstream_app)
+        assert request(app, '/', [(b'x-request-start', b'946733845303')]) == (
+            200, b'downstream')
+        writer.flush()
+        assert '[hirefire:router] queue=' in capsys.readouterr().out
@@ -1,3 +1,41 @@
+import asyncio
+import json
+import threading
+
+import django.db
+import pytest
+from django.test import RequestFactory
+
+from hirefire.contrib.django import views
+from hirefire.contrib.django.middleware import HireFireMiddleware
+from hirefire.procs import Proc, Procs
+
+
+class ThreadRecordingProc(Proc):
+    name = 'recording'
+    queues = ['default']
+
+    def __init__(self, *args, **kwargs):
+        super(ThreadRecordingProc, self).__init__(*args, **kwargs)
+        self.threads = []
+
+    def quantity(self, **kwargs):
+        self.threads.append(threading.get_ident())
+        return 3
+
+
+@pytest.fixture
+def recording_proc(monkeypatch):
+    proc = ThreadRecordingProc()
+    monkeypatch.setattr(HireFireMiddleware, 'loaded_procs',
+                        Procs([(proc.name, proc)]))
+    closed = []
+    monkeypatch.setattr(django.db, 'close_old_connections',
+                        lambda: closed.append(threading.get_ident()))
+    proc.closed = closed
+    return proc
+
+
 class TestHireFireMiddleware:
     def test_test_page(self, client):
         response = client.get('/hirefire/test')
@@ -10,8 +48,73 @@ class TestHireFireMiddleware:
         response = client.get('/hirefire/not-the-token-%s/info' % settings.HIREFIRE_TOKEN)
         assert response.status_code == 404
 
+    def test_metrics(self, client, settings):
+        client.get('/hirefire/%s/info' % settings.HIREFIRE_TOKEN)
+        response = client.get('/hirefire/%s/metrics' % settings.HIREFIRE_TOKEN)
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        assert b'hirefire_proc_duration_seconds_count{proc=' in response.content
+
+        response = client.get('/hirefire/not-the-token-%s/metrics' % settings.HIREFIRE_TOKEN)
+        assert response.status_code == 404
+
 
 class TestQueueTimeMiddleware:
     def test_queue_time(self, client):
         response = client.get('/hirefire/test', HTTP_X_REQUEST_START='946733845303')
         assert response.status_code == 200
+
+
+class TestAsyncHireFireMiddleware:
+    def test_test_page(self, async_client):
+        response = asyncio.run(async_client.get('/hirefire/test'))
+        assert response.status_code == 200
+
+    def test_passes_other_paths_on(self, async_client):
+        response = asyncio.run(async_client.get('/not-hirefire/test'))
+        assert response.status_code == 404
+
+    def test_info_evaluates_sync_procs_in_worker_threads(
+            self, async_client, settings, recording_proc):
+        async def get():
+            response = await async_client.get(
+                '/hirefire/%s/info' % settings.HIREFIRE_TOKEN)
+            return response, threading.get_ident()
+
+        response, loop_thread = asyncio.run(get())
+        assert response.status_code == 200
+        assert json.loads(response.content) == [
+            {'name': 'recording', 'quantity': 3}]
+        assert recording_proc.threads
+        assert loop_thread not in recording_proc.threads
+        # The connections are closed in the thread that used them.
+        assert recording_proc.closed == recording_proc.threads
+
+
+class TestHireFireViews:
+    @pytest.fixture(autouse=True)
+    def without_middleware(self, settings):
+        settings.MIDDLEWARE = [
+            name for name in settings.MIDDLEWARE
+            if not name.endswith('.HireFireMiddleware')
+        ]
+
+    def test_test_page(self, client):
+        response = client.get('/hirefire/test')
+        assert response.status_code == 200
+
+    def test_token(self, client, settings):
+        response = client.get('/hirefire/%s/info' % settings.HIREFIRE_TOKEN)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/json'
+
+        response = client.get('/hirefire/not-the-token-%s/info' % settings.HIREFIRE_TOKEN)
+        assert response.status_code == 404
+
+    def test_async_info(self, settings, recording_proc):
+        request = RequestFactory().get(
+            '/hirefire/%s/info' % settings.HIREFIRE_TOKEN)
+        response = asyncio.run(views.ainfo(request))
+        assert response.status_code == 200
+        assert json.loads(response.content) == [
+            {'name': 'recording', 'quantity': 3}]
@@ -1,8 +1,13 @@
+import time
+
+import pytest
+from fakeredis import FakeRedis, FakeServer
 from redis import Redis
 from rq.queue import Queue
-from rq.registry import StartedJobRegistry
+from rq.registry import DeferredJobRegistry, ScheduledJobRegistry, StartedJobRegistry
 
 from hirefire.procs import load_procs, loaded_procs
+from hirefire.procs.rq import RQProc
 
 
 class TestRQProc:
@@ -49,3 +54,42 @@ class TestRQProc:
 	@classmethod
 	def _dummy_func(cls):
 		pass
+
+
+class TestRQProcStatuses:
+
+	def setup_method(self):
+		self.connection = FakeRedis(server=FakeServer())
+		queue = Queue('default', connection=self.connection)
+		queue.enqueue(print)
+		now = time.time()
+		self.connection.zadd(StartedJobRegistry.key_template.format('default'), {'started': now + 60})
+		self.connection.zadd(ScheduledJobRegistry.key_template.format('default'), {'due': now - 1, 'later': now + 30})
+		self.connection.zadd(DeferredJobRegistry.key_template.format('default'), {'deferred': now + 60})
+
+	def _proc(self, **attrs):
+		proc = RQProc(name='statuses', queues=['default'], connection=self.connection)
+		for name, value in attrs.items():
+			setattr(proc, name, value)
+		return proc
+
+	def test_default_statuses(self):
+		assert self._proc().quantity() == 3
+
+	def test_scheduled_horizon(self):
+		assert self._proc(scheduled_horizon=60).quantity() == 4
+
+	def test_selected_statuses(self):
+		assert self._proc(count_statuses=['queued']).quantity() == 1
+		assert self._proc(count_statuses=['queued', 'started', 'scheduled', 'deferred']).quantity() == 4
+
+	def test_expired_registry_entries(self):
+		for registry in [StartedJobRegistry, DeferredJobRegistry]:
+			key = registry.key_template.format('default')
+			self.connection.zadd(key, {'expired': time.time() - 1, 'persistent': -1})
+		assert self._proc(count_statuses=['started']).quantity() == 2
+		assert self._proc(count_statuses=['deferred']).quantity() == 2
+
+	def test_invalid_status(self):
+		with pytest.raises(ValueError):
+			self._proc(count_statuses=['failed']).quantity()
@@ -40,3 +40,22 @@ def test_hirefire_info(flask_app, monkeypatch, token, status_code):
         response = client.get(f"/hirefire/{token}/info")
 
     assert response.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "token, status_code",
+    (("test", HTTPStatus.OK), ("garbage", HTTPStatus.NOT_FOUND))
+)
+def test_hirefire_metrics(flask_app, monkeypatch, token, status_code):
+    """Enforce the presence of the HireFire token in the metrics path."""
+
+    monkeypatch.setattr("hirefire.procs.load_procs", lambda *args: args)
+
+    from hirefire.contrib.flask.blueprint import build_hirefire_blueprint
+
+    flask_app.register_blueprint(build_hirefire_blueprint("test", ("proc",)))
+
+    with flask_app.test_client() as client:
+        response = client.get(f"/hirefire/{token}/metrics")
+
+    assert response.status_code == status_code
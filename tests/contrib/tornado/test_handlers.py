@@ -0,0 +1,51 @@
+"""Tests for the Tornado handlers."""
+
+import json
+
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from hirefire.contrib.tornado.handlers import hirefire_handlers
+from hirefire.procs import HIREFIRE_FOUND, Proc, loaded_procs
+
+
+class WorkerProc(Proc):
+    name = 'tornado_worker'
+    queues = ['default']
+
+    async def aquantity(self, **kwargs):
+        return 4
+
+
+class TestHireFireHandlers(AsyncHTTPTestCase):
+    def get_app(self):
+        return tornado.web.Application(
+            hirefire_handlers('test', [WorkerProc()]))
+
+    def tearDown(self):
+        loaded_procs.pop(WorkerProc.name, None)
+        super(TestHireFireHandlers, self).tearDown()
+
+    def test_test_page(self):
+        response = self.fetch('/hirefire/test')
+        assert response.code == 200
+        assert response.body.decode() == HIREFIRE_FOUND
+
+    def test_info(self):
+        response = self.fetch('/hirefire/test/info')
+        assert response.code == 200
+        data = json.loads(response.body)
+        assert {'name': 'tornado_worker', 'quantity': 4} in data
+
+        response = self.fetch('/hirefire/garbage/info')
+        assert response.code == 404
+
+    def test_metrics(self):
+        self.fetch('/hirefire/test/info')
+        response = self.fetch('/hirefire/test/metrics')
+        assert response.code == 200
+        assert (b'hirefire_proc_quantity{proc="tornado_worker"} 4' in
+                response.body.splitlines())
+
+        response = self.fetch('/hirefire/garbage/metrics')
+        assert response.code == 404
@@ -0,0 +1,85 @@
+"""Tests for the WSGI middleware."""
+
+import json
+
+import pytest
+from werkzeug.test import Client
+
+from hirefire.contrib.wsgi.middleware import (
+    HireFireMiddleware, QueueTimeMiddleware,
+)
+from hirefire.procs import HIREFIRE_FOUND, Proc, loaded_procs
+from hirefire.queuetime import writer
+
+
+class WorkerProc(Proc):
+    name = 'wsgi_worker'
+    queues = ['default']
+    calls = 0
+
+    def quantity(self, **kwargs):
+        WorkerProc.calls += 1
+        return 3
+
+
+def downstream_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'downstream']
+
+
+@pytest.fixture
+def client():
+    yield Client(HireFireMiddleware(downstream_app, 'test', [WorkerProc()]))
+    loaded_procs.pop(WorkerProc.name, None)
+
+
+class TestHireFireMiddleware:
+    def test_test_page(self, client):
+        response = client.get('/hirefire/test')
+        assert response.status_code == 200
+        assert response.get_data(as_text=True) == HIREFIRE_FOUND
+
+    def test_info(self, client):
+        response = client.get('/hirefire/test/info')
+        assert response.status_code == 200
+        assert response.content_type == 'application/json'
+        assert {'name': 'wsgi_worker', 'quantity': 3} in json.loads(
+            response.get_data())
+
+        response = client.get('/hirefire/garbage/info')
+        assert response.get_data() == b'downstream'
+
+    def test_passes_other_paths(self, client):
+        assert client.get('/').get_data() == b'downstream'
+
+    def test_not_found_without_app(self):
+        client = Client(HireFireMiddleware(None, 'test', [WorkerProc()]))
+        try:
+            assert client.get('/').status_code == 404
+        finally:
+            loaded_procs.pop(WorkerProc.name, None)
+
+    def test_snapshot_payload_is_reused(self):
+        middleware = HireFireMiddleware(None, 'test', [WorkerProc()],
+                                        snapshot_interval=60)
+        client = Client(middleware)
+        try:
+            first = client.get('/hirefire/test/info')
+            snapshot = middleware.snapshot_poller.snapshot
+            second = client.get('/hirefire/test/info')
+            assert first.get_data() == second.get_data()
+            assert 'X-HireFire-Snapshot-Age' in second.headers
+            assert middleware.snapshot_poller.snapshot.payload is (
+                snapshot.payload)
+        finally:
+            middleware.snapshot_poller.stop()
+            loaded_procs.pop(WorkerProc.name, None)
+
+
+class TestQueueTimeMiddleware:
+    def test_queue_time(self, capsys):
+        client = Client(QueueTimeMiddleware(downstream_app))
+        response = client.get('/', headers={'X-Request-Start': '946733845303'})
+        assert response.get_data() == b'downstream'
+        writer.flush()
+        assert '[hirefire:router] queue=' in capsys.readouterr().out
@@ -0,0 +1,95 @@
+"""Tests for the command line interface, with a local stand-in broker."""
+
+import asyncio
+import json
+
+import pytest
+from fakeredis import FakeRedis, FakeServer
+
+from hirefire import cli
+from hirefire.procs import Proc, loaded_procs
+
+connection = FakeRedis(server=FakeServer())
+
+
+class WorkerProc(Proc):
+    name = 'cli_worker'
+    queues = ['default']
+
+    def redis_queries(self):
+        return [(connection, 'llen', ('default',))]
+
+    def quantity_from_redis(self, results):
+        return sum(results)
+
+    def quantity(self, **kwargs):
+        return connection.llen('default')
+
+
+@pytest.fixture(autouse=True)
+def queue():
+    connection.delete('default')
+    connection.rpush('default', 'first', 'second')
+    yield
+    loaded_procs.pop(WorkerProc.name, None)
+
+
+def run(capsys, *argv):
+    assert cli.main(list(argv) + ['--procs', 'tests.test_cli.WorkerProc']) == 0
+    return capsys.readouterr().out
+
+
+class TestCommands:
+    def test_procs_from_environment(self, monkeypatch):
+        monkeypatch.setenv('HIREFIRE_PROCS',
+                           'tests.test_cli.WorkerProc, tests.test_cli.Other')
+        assert cli.env_list('HIREFIRE_PROCS') == [
+            'tests.test_cli.WorkerProc', 'tests.test_cli.Other']
+
+    def test_requires_procs(self, monkeypatch, capsys):
+        monkeypatch.delenv('HIREFIRE_PROCS', raising=False)
+        with pytest.raises(SystemExit):
+            cli.main(['serve'])
+        assert 'at least one proc is required' in capsys.readouterr().err
+
+    def test_info(self, capsys):
+        assert json.loads(run(capsys, 'info')) == [
+            {'name': 'cli_worker', 'quantity': 2}]
+
+    def test_profile(self, capsys):
+        rows = json.loads(run(capsys, 'profile', '--runs', '3', '--json'))
+        assert len(rows) == 1
+        row = rows[0]
+        assert row['proc'] == 'cli_worker'
+        assert row['quantity'] == 2
+        assert row['runs'] == 3
+        assert row['errors'] == 0
+        # The queries of the proc are run in one pipeline per evaluation.
+        assert row['round_trips_per_run'] == 1
+        assert row['latency_ms']['p50'] <= row['latency_ms']['max']
+
+    def test_profile_table(self, capsys):
+        output = run(capsys, 'profile', '--runs', '2')
+        assert output.splitlines()[1].startswith('cli_worker ')
+
+    def test_bench(self, capsys):
+        rows = json.loads(run(capsys, 'bench', '--runs', '2', '--json'))
+        assert [row['mode'] for row in rows] == [
+            'sequential', 'concurrent', 'async']
+        assert all(row['errors'] == 0 for row in rows)
+
+    def test_async_runs_share_one_loop(self):
+        loops = []
+
+        async def func():
+            loops.append(asyncio.get_running_loop())
+            if len(loops) == 2:
+                raise ValueError('failed')
+            return len(loops)
+
+        result, last = asyncio.run(cli.async_timed_runs(3, func))
+        assert len(set(loops)) == 1
+        assert result['runs'] == 3
+        assert result['errors'] == 1
+        assert result['last_error'] == "ValueError('failed')"
+        assert last == 3
@@ -0,0 +1,74 @@
+import pytest
+
+from hirefire import hooks
+from hirefire.procs import Proc, Procs, serialize_procs
+
+
+class WorkerProc(Proc):
+    name = 'worker'
+    queues = ['default']
+
+    def quantity(self, cache=None, **kwargs):
+        cache['seen'] = True
+        return 5
+
+
+class BrokenProc(Proc):
+    name = 'broken'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        raise IOError('broker down')
+
+
+@pytest.fixture
+def calls():
+    calls = []
+    registered = []
+    for event in hooks.EVENTS:
+        def hook(event=event, **kwargs):
+            calls.append((event, kwargs))
+        registered.append((event, hooks.register(event, hook)))
+    yield calls
+    for event, hook in registered:
+        hooks.unregister(event, hook)
+    assert not hooks.enabled
+
+
+class TestHooks:
+    def test_called_around_procs(self, calls):
+        procs = Procs(worker=WorkerProc())
+        data = serialize_procs(procs)
+        assert [event for event, kwargs in calls] == [
+            'before_serialize', 'before_proc', 'after_proc',
+            'after_serialize']
+        assert calls[0][1]['procs'] is procs
+        assert calls[1][1]['proc'] is procs['worker']
+        after_proc = calls[2][1]
+        assert after_proc['quantity'] == 5
+        assert after_proc['duration'] >= 0
+        assert after_proc['cache'] == {'seen': True}
+        assert calls[3][1]['data'] == data
+
+    def test_on_error(self, calls):
+        with pytest.raises(IOError):
+            serialize_procs(Procs(broken=BrokenProc()))
+        event, kwargs = calls[2]
+        assert event == 'on_error'
+        assert isinstance(kwargs['error'], IOError)
+
+    def test_failing_hook_is_logged(self, caplog):
+        @hooks.register('before_proc')
+        def failing(**kwargs):
+            raise ValueError('oops')
+
+        try:
+            assert serialize_procs(Procs(worker=WorkerProc())) == [
+                {'name': 'worker', 'quantity': 5}]
+        finally:
+            hooks.unregister('before_proc', failing)
+        assert 'The HireFire before_proc hook' in caplog.text
+
+    def test_unknown_event(self):
+        with pytest.raises(ValueError):
+            hooks.register('after_everything', lambda **kwargs: None)
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from hirefire import metrics
+from hirefire.metrics import Registry
+from hirefire.procs import Proc, Procs, serialize_procs
+
+
+class WorkerProc(Proc):
+    name = 'metrics_worker'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        return 3
+
+
+class BrokenProc(Proc):
+    name = 'metrics_broken'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        raise IOError('broker down')
+
+
+class SlowProc(Proc):
+    name = 'metrics_slow'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        time.sleep(0.2)
+        return 1
+
+
+class TestRegistry:
+    def test_render(self):
+        registry = Registry()
+        errors = registry.counter('errors_total', 'Errors.', ['proc'])
+        errors.inc(proc='worker')
+        errors.inc(2, proc='worker')
+        registry.gauge('quantity', 'Quantity.', ['proc']).set(4, proc='a"b')
+        duration = registry.histogram('duration_seconds', 'Duration.',
+                                      buckets=(0.1, 1))
+        duration.observe(0.05)
+        duration.observe(0.5)
+        assert registry.render() == '\n'.join([
+            '# HELP errors_total Errors.',
+            '# TYPE errors_total counter',
+            'errors_total{proc="worker"} 3',
+            '# HELP quantity Quantity.',
+            '# TYPE quantity gauge',
+            'quantity{proc="a\\"b"} 4',
+            '# HELP duration_seconds Duration.',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{le="0.1"} 1',
+            'duration_seconds_bucket{le="1"} 2',
+            'duration_seconds_bucket{le="+Inf"} 2',
+            'duration_seconds_sum 0.55',
+            'duration_seconds_count 2',
+        ]) + '\n'
+
+    def test_get_or_create(self):
+        registry = Registry()
+        counter = registry.counter('total', 'Total.')
+        assert registry.counter('total', 'Total.') is counter
+        with pytest.raises(ValueError):
+            registry.gauge('total', 'Total.')
+
+    def test_labels_are_required(self):
+        counter = Registry().counter('total', 'Total.', ['proc'])
+        with pytest.raises(ValueError):
+            counter.inc()
+
+
+class TestProcMetrics:
+    def test_records_procs(self):
+        procs = Procs(metrics_worker=WorkerProc())
+        count, total = (metrics.proc_duration.get(proc='metrics_worker') or
+                        (0, 0.0))
+        serialize_procs(procs)
+        assert metrics.proc_duration.get(
+            proc='metrics_worker')[0] == count + 1
+        assert metrics.proc_quantity.get(proc='metrics_worker') == 3
+
+    def test_records_errors(self):
+        procs = Procs(metrics_broken=BrokenProc())
+        errors = metrics.proc_errors.get(proc='metrics_broken') or 0
+        with pytest.raises(IOError):
+            serialize_procs(procs)
+        assert metrics.proc_errors.get(proc='metrics_broken') == errors + 1
+
+    def test_records_deadline_misses(self):
+        procs = Procs(metrics_slow=SlowProc())
+        misses = metrics.proc_deadline_misses.get(proc='metrics_slow') or 0
+        serialize_procs(procs, timeout=0.01)
+        assert metrics.proc_deadline_misses.get(
+            proc='metrics_slow') == misses + 1
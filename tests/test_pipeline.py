@@ -0,0 +1,76 @@
+import pytest
+from fakeredis import FakeRedis, FakeServer
+from rq import Queue
+
+from hirefire.pipeline import RedisPipeline
+from hirefire.procs import Procs, serialize_procs
+from hirefire.procs.rq import RQProc
+
+
+class CountingRedis(FakeRedis):
+    pipelines = 0
+
+    def pipeline(self, *args, **kwargs):
+        CountingRedis.pipelines += 1
+        return super(CountingRedis, self).pipeline(*args, **kwargs)
+
+
+@pytest.fixture
+def connection():
+    CountingRedis.pipelines = 0
+    return CountingRedis(server=FakeServer())
+
+
+def rq_proc(name, queues, connection):
+    for index, queue in enumerate(queues):
+        for _ in range(index + 1):
+            Queue(queue, connection=connection).enqueue(print)
+    return RQProc(name=name, queues=queues, connection=connection)
+
+
+class TestRedisPipeline:
+    def test_results_keep_query_order(self, connection):
+        first = connection
+        other = FakeRedis(server=FakeServer())
+        first.rpush('a', 1, 2)
+        other.rpush('b', 1)
+
+        pipeline = RedisPipeline()
+        pipeline.add('proc', [(first, 'llen', ('a',)),
+                              (other, 'llen', ('b',)),
+                              (first, 'llen', ('c',))])
+        assert len(pipeline) == 2
+        assert pipeline.execute() == {'proc': [2, 1, 0]}
+
+
+class TestSerializeProcsPipeline:
+    def test_one_round_trip_per_server(self, connection):
+        procs = Procs([
+            ('high', rq_proc('high', ['a', 'b'], connection)),
+            ('low', rq_proc('low', ['c', 'd', 'e'], connection)),
+        ])
+        CountingRedis.pipelines = 0
+
+        assert serialize_procs(procs) == [
+            {'name': 'high', 'quantity': 3},
+            {'name': 'low', 'quantity': 6},
+        ]
+        assert CountingRedis.pipelines == 1
+
+        assert serialize_procs(procs, redis_pipeline=False) == [
+            {'name': 'high', 'quantity': 3},
+            {'name': 'low', 'quantity': 6},
+        ]
+        assert CountingRedis.pipelines == 3
+
+    def test_overridden_quantity_is_not_pipelined(self, connection):
+        class ZeroProc(RQProc):
+            def quantity(self, **kwargs):
+                return 0
+
+        Queue('a', connection=connection).enqueue(print)
+        procs = Procs(zero=ZeroProc(name='zero', queues=['a'],
+                                    connection=connection))
+        CountingRedis.pipelines = 0
+        assert serialize_procs(procs) == [{'name': 'zero', 'quantity': 0}]
+        assert CountingRedis.pipelines == 0
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hirefire.procs import (
+    ClientProc, Proc, Procs, async_dump_procs, async_serialize_procs,
+    configure_executor, dump_procs, get_executor, serialize_procs, warm_up,
+)
+from hirefire.utils import Lazy
+
+
+class StaticProc(Proc):
+    queues = ['default']
+
+    def __init__(self, name, value, *args, **kwargs):
+        super(StaticProc, self).__init__(name, *args, **kwargs)
+        self.value = value
+
+    def quantity(self, **kwargs):
+        return self.value
+
+
+class HangingProc(StaticProc):
+    def __init__(self, *args, **kwargs):
+        super(HangingProc, self).__init__(*args, **kwargs)
+        self.hanging = False
+        self.released = threading.Event()
+
+    def quantity(self, **kwargs):
+        if self.hanging:
+            self.released.wait(5)
+        return self.value
+
+
+class SleepingProc(StaticProc):
+    def quantity(self, **kwargs):
+        time.sleep(0.2)
+        return self.value
+
+
+@pytest.fixture
+def hanging():
+    proc = HangingProc('slow', 3)
+    yield proc
+    proc.released.set()
+
+
+class TestSerializeProcsDeadlines:
+    @pytest.mark.parametrize('kwargs', [{'timeout': 0.2},
+                                        {'proc_timeout': 0.2}])
+    def test_missed_deadline_reports_last_quantity(self, hanging, kwargs):
+        procs = Procs([('fast', StaticProc('fast', 1)), ('slow', hanging)])
+        assert serialize_procs(procs, **kwargs) == [
+            {'name': 'fast', 'quantity': 1},
+            {'name': 'slow', 'quantity': 3},
+        ]
+
+        hanging.hanging = True
+        hanging.value = 10
+        assert serialize_procs(procs, **kwargs) == [
+            {'name': 'fast', 'quantity': 1},
+            {'name': 'slow', 'quantity': 3},
+        ]
+
+    def test_hanging_proc_takes_one_worker_only(self, hanging):
+        procs = Procs([('fast', StaticProc('fast', 1)), ('slow', hanging)])
+        try:
+            configure_executor(max_workers=3)
+            serialize_procs(procs, timeout=0.2)
+            hanging.hanging = True
+            fast = procs['fast']
+            for value in range(2, 7):
+                fast.value = value
+                assert serialize_procs(procs, timeout=0.2) == [
+                    {'name': 'fast', 'quantity': value},
+                    {'name': 'slow', 'quantity': 3},
+                ]
+        finally:
+            hanging.released.set()
+            configure_executor()
+
+    @pytest.mark.parametrize('kwargs,quantities', [
+        ({'proc_timeout': 0.3}, [1, 2]),
+        ({'timeout': 0.3}, [1, 0]),
+    ])
+    def test_proc_timeout_counts_from_its_start(self, kwargs, quantities):
+        procs = Procs([('first', SleepingProc('first', 1)),
+                       ('second', SleepingProc('second', 2))])
+        try:
+            # The second proc only starts once the first one is done.
+            configure_executor(max_workers=1)
+            data = serialize_procs(procs, redis_pipeline=False, **kwargs)
+        finally:
+            configure_executor()
+        assert [proc['quantity'] for proc in data] == quantities
+
+    def test_missed_deadline_without_last_quantity(self, hanging):
+        hanging.hanging = True
+        procs = Procs(slow=hanging)
+        assert serialize_procs(procs, timeout=0.1) == [
+            {'name': 'slow', 'quantity': 0},
+        ]
+
+
+class TestExecutor:
+    def test_executor_is_reused(self):
+        procs = Procs(fast=StaticProc('fast', 1))
+        executor = get_executor()
+        assert serialize_procs(procs, use_concurrency=True) == [
+            {'name': 'fast', 'quantity': 1},
+        ]
+        assert get_executor() is executor
+
+    def test_exit_does_not_wait_for_hanging_procs(self):
+        script = textwrap.dedent('''
+            import time
+            from hirefire.procs import Proc, Procs, serialize_procs
+
+            class HangingProc(Proc):
+                name = 'hanging'
+                queues = ['default']
+
+                def quantity(self, **kwargs):
+                    time.sleep(10)
+                    return 1
+
+            serialize_procs(Procs(hanging=HangingProc()), timeout=0.1)
+        ''')
+        start = time.monotonic()
+        subprocess.run([sys.executable, '-c', script], check=True,
+                       timeout=30)
+        assert time.monotonic() - start < 5
+
+    def test_configure_executor(self):
+        executor = get_executor()
+        try:
+            configure_executor(max_workers=2)
+            assert get_executor() is not executor
+            assert get_executor()._max_workers == 2
+        finally:
+            configure_executor()
+
+
+class AsyncProc(StaticProc):
+    async def aquantity(self, **kwargs):
+        await asyncio.sleep(0)
+        return self.value
+
+
+class TestAsyncSerializeProcs:
+    def test_native_and_bridged_procs(self):
+        procs = Procs([('sync', StaticProc('sync', 1)),
+                       ('async', AsyncProc('async', 2))])
+        assert asyncio.run(async_serialize_procs(procs)) == [
+            {'name': 'sync', 'quantity': 1},
+            {'name': 'async', 'quantity': 2},
+        ]
+
+    def test_missed_deadline_reports_last_quantity(self, hanging):
+        procs = Procs(slow=hanging)
+        asyncio.run(async_serialize_procs(procs))
+        hanging.hanging = True
+        hanging.value = 10
+        assert asyncio.run(async_serialize_procs(procs, timeout=0.1)) == [
+            {'name': 'slow', 'quantity': 3},
+        ]
+
+    def test_hanging_proc_takes_one_worker_only(self, hanging):
+        procs = Procs([('fast', StaticProc('fast', 1)), ('slow', hanging)])
+        try:
+            configure_executor(max_workers=3)
+            asyncio.run(async_serialize_procs(procs, timeout=0.2))
+            hanging.hanging = True
+            for _ in range(5):
+                assert asyncio.run(
+                    async_serialize_procs(procs, timeout=0.2)) == [
+                    {'name': 'fast', 'quantity': 1},
+                    {'name': 'slow', 'quantity': 3},
+                ]
+        finally:
+            hanging.released.set()
+            configure_executor()
+
+    @pytest.mark.parametrize('kwargs,quantities', [
+        ({'proc_timeout': 0.3}, [1, 2]),
+        ({'timeout': 0.3}, [1, 0]),
+    ])
+    def test_proc_timeout_counts_from_its_start(self, kwargs, quantities):
+        procs = Procs([('first', SleepingProc('first', 1)),
+                       ('second', SleepingProc('second', 2))])
+        try:
+            configure_executor(max_workers=1)
+            data = asyncio.run(async_serialize_procs(
+                procs, redis_pipeline=False, **kwargs))
+        finally:
+            configure_executor()
+        assert [proc['quantity'] for proc in data] == quantities
+
+    def test_async_dump_procs(self):
+        procs = Procs(sync=StaticProc('sync', 1))
+        assert json.loads(asyncio.run(async_dump_procs(procs))) == [
+            {'name': 'sync', 'quantity': 1},
+        ]
+
+
+class SlowCountingProc(StaticProc):
+    calls = 0
+
+    def quantity(self, **kwargs):
+        SlowCountingProc.calls += 1
+        time.sleep(0.1)
+        return self.value
+
+
+class TestCoalescing:
+    def test_concurrent_dumps_share_one_evaluation(self):
+        SlowCountingProc.calls = 0
+        procs = Procs(slow=SlowCountingProc('slow', 1))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            payloads = list(executor.map(dump_procs, [procs] * 8))
+        assert len(set(payloads)) == 1
+        assert SlowCountingProc.calls == 1
+
+    def test_concurrent_async_dumps_share_one_evaluation(self):
+        SlowCountingProc.calls = 0
+        procs = Procs(slow=SlowCountingProc('slow', 1))
+
+        async def dump_concurrently():
+            return await asyncio.gather(
+                *[async_dump_procs(procs) for _ in range(8)])
+
+        assert len(set(asyncio.run(dump_concurrently()))) == 1
+        assert SlowCountingProc.calls == 1
+
+
+class CountingClientProc(ClientProc):
+    name = 'clients'
+    queues = ['first', 'second']
+    built = 0
+
+    def client(self, queue):
+        CountingClientProc.built += 1
+        return queue.upper()
+
+    def quantity(self, **kwargs):
+        return len(self.clients)
+
+
+class TestLazyLoading:
+    def test_clients_are_built_on_first_use(self):
+        CountingClientProc.built = 0
+        proc = CountingClientProc()
+        assert CountingClientProc.built == 0
+        assert proc.clients == ['FIRST', 'SECOND']
+        assert proc.quantity() == 2
+        assert CountingClientProc.built == 2
+
+    def test_procs_build_their_clients_independently(self):
+        building, release = threading.Event(), threading.Event()
+
+        class BlockingClientProc(CountingClientProc):
+            def client(self, queue):
+                building.set()
+                release.wait(5)
+                return queue
+
+        blocked = threading.Thread(target=lambda: BlockingClientProc().clients)
+        blocked.start()
+        try:
+            assert building.wait(5)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(lambda: CountingClientProc().clients)
+                assert future.result(1) == ['FIRST', 'SECOND']
+        finally:
+            release.set()
+            blocked.join(5)
+
+    def test_lazy_loads_once(self):
+        calls = []
+        lazy = Lazy(lambda: calls.append(1) or len(calls))
+        assert not lazy.loaded
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert set(executor.map(lambda _: lazy(), range(8))) == {1}
+        assert lazy.loaded
+
+    def test_warm_up(self):
+        CountingClientProc.built = 0
+        procs = Lazy(lambda: Procs(clients=CountingClientProc()))
+        warm_up(procs).join()
+        assert procs.loaded
+        assert CountingClientProc.built == 2
@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from hirefire.procs import Procs, serialize_procs
+from hirefire.procs.queuetime import QueueTimeProc
+from hirefire.queuetime import (
+    BatchWriter, QueueTimeHistogram, get_queue_time, histogram,
+    record_queue_time, writer,
+)
+
+
+class SlowStream(io.StringIO):
+    def __init__(self):
+        super(SlowStream, self).__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, value):
+        self.writing.set()
+        self.release.wait(5)
+        return super(SlowStream, self).write(value)
+
+
+class TestGetQueueTime:
+    def test_queue_time(self):
+        assert get_queue_time('1000', now=1.5) == 500
+
+    def test_clock_drift(self):
+        assert get_queue_time('2000', now=1.5) == 0
+
+    def test_invalid(self):
+        assert get_queue_time('garbage') is None
+
+
+class TestBatchWriter:
+    def test_writes_in_order(self):
+        stream = io.StringIO()
+        writer = BatchWriter(stream, interval=0)
+        for i in range(100):
+            writer.write('line %d' % i)
+        writer.flush()
+        assert stream.getvalue() == ''.join('line %d\n' % i
+                                            for i in range(100))
+
+    def test_does_not_block_on_slow_stream(self):
+        stream = SlowStream()
+        writer = BatchWriter(stream, interval=0)
+        writer.write('first')
+        assert stream.writing.wait(5)
+        # The background thread is stuck writing, writing more is not.
+        writer.write('second')
+        stream.release.set()
+        writer.flush()
+        assert stream.getvalue() == 'first\nsecond\n'
+
+    def test_drops_oldest_lines(self, caplog):
+        stream = io.StringIO()
+        writer = BatchWriter(stream, max_lines=3, interval=60)
+        for i in range(5):
+            writer.write('line %d' % i)
+        writer.flush()
+        assert stream.getvalue() == 'line 2\nline 3\nline 4\n'
+        assert 'Dropped 2 queue time lines' in caplog.text
+
+
+class TestQueueTimeHistogram:
+    def test_percentiles(self):
+        histogram = QueueTimeHistogram(buckets=(10, 100, 1000))
+        for queue_time in [5] * 90 + [50] * 5 + [500] * 5:
+            histogram.add(queue_time, now=1000)
+        assert histogram.counts(now=1000) == [90, 5, 5, 0]
+        assert histogram.percentile(50, now=1000) == pytest.approx(5.556,
+                                                                   abs=1e-3)
+        assert histogram.percentile(95, now=1000) == 100
+        assert histogram.percentile(99, now=1000) == 820
+
+    def test_window_slides(self):
+        histogram = QueueTimeHistogram(window=60, slots=6)
+        histogram.add(500, now=1000)
+        histogram.add(5, now=1030)
+        assert sum(histogram.counts(now=1030)) == 2
+        assert sum(histogram.counts(now=1065)) == 1
+        assert histogram.percentile(95, now=1100) is None
+
+    def test_overflow(self):
+        histogram = QueueTimeHistogram(buckets=(10, 100))
+        histogram.add(5000, now=1000)
+        assert histogram.percentile(95, now=1000) == 100
+
+
+class TestSharedQueueTimeHistogram:
+    def worker(self, directory, pid, monkeypatch, queue_times, now):
+        """
+        Record the queue times in a histogram of the worker process pid.
+        """
+        histogram = QueueTimeHistogram(buckets=(10, 100, 1000),
+                                       directory=str(directory))
+        histogram.publish_interval = 0
+        monkeypatch.setattr('hirefire.queuetime.os.getpid', lambda: pid)
+        for queue_time in queue_times:
+            histogram.add(queue_time, now=now)
+        monkeypatch.undo()
+        return histogram
+
+    def test_aggregates_the_processes(self, tmpdir, monkeypatch):
+        self.worker(tmpdir, 1, monkeypatch, [5] * 3, now=1000)
+        self.worker(tmpdir, 2, monkeypatch, [50] * 2, now=1000)
+        reader = QueueTimeHistogram(buckets=(10, 100, 1000),
+                                    directory=str(tmpdir))
+        reader.add(500, now=1000)
+        assert reader.counts(now=1000) == [3, 2, 1, 0]
+        assert reader.percentile(50, now=1000) == pytest.approx(10)
+
+    def test_publishes_the_last_queue_times(self, tmpdir):
+        worker = QueueTimeHistogram(buckets=(10, 100, 1000),
+                                    directory=str(tmpdir))
+        worker.publish_interval = 0.05
+
+        def published():
+            with open(worker.path()) as fp:
+                return json.load(fp)['slots'][0][1]
+
+        for queue_time in [5, 5, 50]:
+            worker.add(queue_time, now=1000)
+        assert published() == [1, 0, 0, 0]
+        time.sleep(0.2)
+        assert published() == [2, 1, 0, 0]
+
+    def test_removes_files_older_than_the_window(self, tmpdir, monkeypatch):
+        self.worker(tmpdir, 1, monkeypatch, [5], now=1000)
+        reader = QueueTimeHistogram(buckets=(10, 100, 1000),
+                                    directory=str(tmpdir))
+        assert sum(reader.counts(now=1030)) == 1
+        assert sum(reader.counts(now=1100)) == 0
+        assert not os.listdir(str(tmpdir))
+
+
+class TestQueueTimeProc:
+    def test_quantity(self):
+        histogram = QueueTimeHistogram(buckets=(10, 100, 1000))
+        proc = QueueTimeProc(name='web', percentile=50, histogram=histogram)
+        assert proc.quantity() == 0
+        for queue_time in (50, 50, 50):
+            histogram.add(queue_time)
+        assert proc.quantity() == 55
+        assert serialize_procs(Procs(web=proc)) == [
+            {'name': 'web', 'quantity': 55}]
+
+    def test_records_from_middleware(self):
+        histogram.reset()
+        try:
+            record_queue_time(250)
+            writer.flush()
+            assert 200 < QueueTimeProc(name='web').quantity() <= 300
+        finally:
+            histogram.reset()
@@ -0,0 +1,96 @@
+"""Tests for the asyncio server."""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+
+import pytest
+
+from hirefire.procs import HIREFIRE_FOUND, Proc, loaded_procs
+from hirefire.server import HireFireServer
+
+
+class WorkerProc(Proc):
+    name = 'server_worker'
+    queues = ['default']
+
+    def quantity(self, **kwargs):
+        return 4
+
+
+async def fetch(server, raw):
+    if server.sockets[0].family == socket.AF_UNIX:
+        reader, writer = await asyncio.open_unix_connection(
+            server.sockets[0].getsockname())
+    else:
+        reader, writer = await asyncio.open_connection(
+            *server.sockets[0].getsockname()[:2])
+    writer.write(raw)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ')[1]), head, body
+
+
+def serve(*raws, **kwargs):
+    """
+    Start a server and return its responses to the raw requests.
+    """
+    path = kwargs.pop('path', None)
+
+    async def run():
+        hirefire_server = HireFireServer([WorkerProc()], 'test', **kwargs)
+        server = await hirefire_server.start(port=0, path=path)
+        try:
+            return [await fetch(server, raw) for raw in raws]
+        finally:
+            hirefire_server.close()
+    return asyncio.run(run())
+
+
+def get(*paths, **kwargs):
+    responses = serve(*[b'GET %s HTTP/1.1\r\nHost: x\r\n\r\n' %
+                        path.encode('ascii') for path in paths], **kwargs)
+    return responses[0] if len(paths) == 1 else responses
+
+
+@pytest.fixture(autouse=True)
+def forget_procs():
+    yield
+    loaded_procs.pop(WorkerProc.name, None)
+
+
+class TestHireFireServer:
+    def test_test_page(self):
+        status, head, body = get('/hirefire/test')
+        assert status == 200
+        assert b'connection: close' in head
+        assert body == HIREFIRE_FOUND.encode('utf-8')
+
+    def test_info(self):
+        status, head, body = get('/hirefire/test/info')
+        assert status == 200
+        assert b'x-hirefire-snapshot-age' in head
+        assert json.loads(body) == [{'name': 'server_worker', 'quantity': 4}]
+
+    def test_info_without_snapshot(self):
+        status, head, body = get('/hirefire/test/info',
+                                 snapshot_interval=None)
+        assert status == 200
+        assert b'x-hirefire-snapshot-age' not in head
+        assert json.loads(body) == [{'name': 'server_worker', 'quantity': 4}]
+
+    def test_not_found(self):
+        responses = get('/hirefire/garbage/info', '/')
+        assert [status for status, head, body in responses] == [404, 404]
+
+    def test_bad_request(self):
+        assert serve(b'garbage\r\n\r\n')[0][0] == 400
+
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hirefire.sock')
+        assert get('/hirefire/test', path=path)[0] == 200
+        assert not os.path.exists(path)
+
@@ -0,0 +1,231 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fakeredis import FakeRedis, FakeServer
+
+from hirefire.procs import Proc, Procs, loaded_procs
+from hirefire.snapshot import (
+    FileSnapshotStore, LazyProcs, RedisSnapshotStore, Snapshot,
+    SnapshotPoller, SnapshotUnavailable
+)
+
+
+class CountingProc(Proc):
+    name = 'worker'
+    queues = ['default']
+
+    def __init__(self, *args, **kwargs):
+        super(CountingProc, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    def quantity(self, **kwargs):
+        self.calls += 1
+        return self.calls
+
+
+class SlowAsyncProc(CountingProc):
+    async def aquantity(self, **kwargs):
+        await asyncio.sleep(0.05)
+        return self.quantity()
+
+
+@pytest.fixture
+def procs():
+    return Procs(worker=CountingProc())
+
+
+class TestSnapshotPoller:
+    def test_serves_snapshot_without_recomputing(self, procs):
+        poller = SnapshotPoller(procs, interval=60)
+        try:
+            first = poller.get()
+            assert poller.get() is first
+            assert first.data == [{'name': 'worker', 'quantity': 1}]
+            assert first.age < 60
+        finally:
+            poller.stop()
+
+    def test_stale_snapshot_falls_back_to_sync(self, procs):
+        poller = SnapshotPoller(procs, interval=60, max_age=10)
+        try:
+            stale = poller.get()
+            stale.timestamp -= 30
+            assert poller.get() is not stale
+        finally:
+            poller.stop()
+
+    def test_stale_snapshot_without_fallback(self, procs, monkeypatch):
+        poller = SnapshotPoller(procs, interval=60, max_age=10,
+                                sync_fallback=False)
+        monkeypatch.setattr(poller, 'start', lambda: None)
+        poller.refresh().timestamp -= 30
+        with pytest.raises(SnapshotUnavailable):
+            poller.get()
+
+    def test_concurrent_async_refreshes_of_stale_snapshot(self, monkeypatch):
+        poller = SnapshotPoller(Procs(worker=SlowAsyncProc()), interval=60,
+                                max_age=0.001)
+        monkeypatch.setattr(poller, 'start', lambda: None)
+        poller.refresh().timestamp -= 30
+        results = []
+
+        async def get_both():
+            results.extend(await asyncio.gather(poller.aget(), poller.aget()))
+
+        # Run in a thread, so that a blocked event loop fails the test
+        # instead of hanging it.
+        thread = threading.Thread(target=asyncio.run, args=(get_both(),))
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert len(results) == 2
+
+    def test_async_refresh_while_another_thread_refreshes(self, procs):
+        poller = SnapshotPoller(procs, interval=60)
+        with poller.store.lock():
+            snapshot = asyncio.run(poller.arefresh())
+        assert snapshot.data == [{'name': 'worker', 'quantity': 1}]
+        # Only the thread holding the lock stores its snapshot.
+        assert poller.snapshot is None
+
+
+class TestLazyProcs:
+    def test_procs_and_poller_are_lazy(self):
+        try:
+            lazy_procs = LazyProcs([CountingProc()], snapshot_interval=60)
+            assert not lazy_procs.procs.loaded
+            poller = lazy_procs.snapshot_poller()
+            assert lazy_procs.procs.loaded
+            assert poller.procs is lazy_procs.procs()
+            assert poller.interval == 60
+            assert LazyProcs([CountingProc()]).snapshot_poller() is None
+        finally:
+            loaded_procs.pop(CountingProc.name, None)
+
+    def test_age_header(self):
+        snapshot = Snapshot([], timestamp=time.time() - 1.5)
+        name, value = snapshot.age_header
+        assert name == 'X-HireFire-Snapshot-Age'
+        assert 1.5 <= float(value) < 2.5
+
+
+class TestFileSnapshotStore:
+    def test_round_trip(self, tmpdir):
+        store = FileSnapshotStore(str(tmpdir.join('snapshot.json')))
+        assert store.load() is None
+        snapshot = Snapshot([{'name': 'worker', 'quantity': 3}])
+        store.save(snapshot)
+        loaded = store.load()
+        assert loaded.data == snapshot.data
+        assert loaded.timestamp == snapshot.timestamp
+        assert loaded.origin == snapshot.origin
+        assert store.load() is loaded
+
+    def test_lock_is_exclusive(self, tmpdir):
+        store = FileSnapshotStore(str(tmpdir.join('snapshot.json')))
+        other = FileSnapshotStore(store.path)
+        with store.lock() as acquired:
+            assert acquired
+            with other.lock() as other_acquired:
+                assert not other_acquired
+        with other.lock() as acquired:
+            assert acquired
+
+    def test_key_depends_on_procs(self, procs, tmpdir):
+        store = FileSnapshotStore.for_procs(procs, directory=str(tmpdir))
+        assert store.path.startswith(str(tmpdir))
+        assert store.path != FileSnapshotStore.for_procs(
+            Procs(other=CountingProc()), directory=str(tmpdir)).path
+
+    def test_reads_snapshot_of_other_process(self, procs, tmpdir):
+        store = FileSnapshotStore(str(tmpdir.join('snapshot.json')))
+        store.save(Snapshot([{'name': 'worker', 'quantity': 42}],
+                            origin='other:1'))
+        poller = SnapshotPoller(procs, interval=60, store=store)
+        assert poller.refresh().data == [{'name': 'worker', 'quantity': 42}]
+        assert procs['worker'].calls == 0
+
+    def test_refreshes_while_holding_lock(self, procs, tmpdir):
+        store = FileSnapshotStore(str(tmpdir.join('snapshot.json')))
+        store.save(Snapshot([{'name': 'worker', 'quantity': 42}],
+                            timestamp=time.time() - 120,
+                            origin='other:1'))
+        poller = SnapshotPoller(procs, interval=60, store=store)
+        assert poller.refresh().data == [{'name': 'worker', 'quantity': 1}]
+        assert store.load().data == [{'name': 'worker', 'quantity': 1}]
+
+    def test_serves_stored_snapshot_while_locked(self, procs, tmpdir):
+        store = FileSnapshotStore(str(tmpdir.join('snapshot.json')))
+        store.save(Snapshot([{'name': 'worker', 'quantity': 42}],
+                            timestamp=time.time() - 120,
+                            origin='other:1'))
+        poller = SnapshotPoller(procs, interval=60, store=store)
+        with FileSnapshotStore(store.path).lock():
+            assert poller.refresh().data == [
+                {'name': 'worker', 'quantity': 42}]
+        assert procs['worker'].calls == 0
+
+
+class TestRedisSnapshotStore:
+    @pytest.fixture
+    def server(self):
+        return FakeServer()
+
+    def store(self, server, procs):
+        return RedisSnapshotStore.for_procs(procs, FakeRedis(server=server),
+                                            lease_timeout=10)
+
+    def test_round_trip(self, server, procs):
+        store = self.store(server, procs)
+        assert store.load() is None
+        snapshot = Snapshot([{'name': 'worker', 'quantity': 3}])
+        store.save(snapshot)
+        loaded = self.store(server, procs).load()
+        assert loaded.data == snapshot.data
+        assert loaded.origin == snapshot.origin
+
+    def test_lease_is_exclusive(self, server, procs):
+        store, other = self.store(server, procs), self.store(server, procs)
+        with store.lock() as acquired:
+            assert acquired
+            with other.lock() as other_acquired:
+                assert not other_acquired
+        with other.lock() as acquired:
+            assert acquired
+
+    def test_one_refresh_per_interval_across_nodes(self, server,
+                                                  monkeypatch):
+        nodes = []
+        for host in range(5):
+            procs = Procs(worker=CountingProc())
+            nodes.append((host, procs, SnapshotPoller(
+                procs, interval=60, store=self.store(server, procs))))
+        for host, procs, poller in nodes:
+            monkeypatch.setattr('hirefire.snapshot.current_origin',
+                                lambda: 'web.%d:4' % host)
+            assert poller.refresh().data == [
+                {'name': 'worker', 'quantity': 1}]
+        assert sum(procs['worker'].calls for host, procs, poller in nodes) == 1
+
+    def test_serves_stored_snapshot_while_leased(self, server, procs):
+        store = self.store(server, procs)
+        store.save(Snapshot([{'name': 'worker', 'quantity': 42}],
+                            timestamp=time.time() - 120, origin='other:1'))
+        poller = SnapshotPoller(procs, interval=60, max_age=300, store=store)
+        with self.store(server, procs).lock():
+            assert poller.refresh().data == [
+                {'name': 'worker', 'quantity': 42}]
+        assert poller.refresh().data == [{'name': 'worker', 'quantity': 1}]
+
+    def test_unreachable_redis_falls_back_to_local(self, procs, monkeypatch):
+        # Nothing listens on port 1.
+        store = RedisSnapshotStore.from_url('redis://127.0.0.1:1/0', procs)
+        poller = SnapshotPoller(procs, interval=60, store=store)
+        monkeypatch.setattr(poller, 'start', lambda: None)
+        assert poller.snapshot is None
+        assert poller.get().data == [{'name': 'worker', 'quantity': 1}]
+        assert asyncio.run(poller.aget()).data == [
+            {'name': 'worker', 'quantity': 2}]